@@ -0,0 +1,577 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+############################################################################################
+# BINARY INDEX FORMAT (one directory per index)                                            #
+#                                                                                          #
+# terms.bin, term_offsets.npy : Sorted words as UTF-8. Word i is bytes [o[i], o[i + 1]).   #
+# document_frequencies.npy    : Number of documents of every word (uint32).                #
+# max_term_frequencies.npy    : Largest TF / document norm in every postings list.         #
+# postings_offsets.npy        : Byte range of every postings list in doc_ids.bin.          #
+# doc_ids.bin                 : Delta encoded document ids, as LEB128 varints.             #
+# term_frequencies.bin        : TF of every posting (float32), in postings order.          #
+# urls.bin, url_offsets.npy   : Url of every document id, as UTF-8.                        #
+# url_order.npy               : Document ids in the order of their urls, to find a url.    #
+# document_norms.bin          : L2 norm of every document vector (float64).                #
+# document_terms.bin          : Term numbers of the words of every document (uint32).      #
+# document_term_offsets.npy   : Range of the term numbers of every document. Both files    #
+#                               are written with the segments of incremental updates, and  #
+#                               for a full build the first time a document is deleted.     #
+#                                                                                          #
+# Weights are stored as TF and multiplied by the IDF of the word when its postings are     #
+# read, with the IDF computed from the document frequencies. Every file is memory mapped,  #
+# so opening the index is instant and processes share one copy through the page cache.    #
+############################################################################################
+
+import os
+import math
+import numpy as np
+
+# Postings sorted by document id at once, when the term numbers of every document are written.
+POSTINGS_PER_CHUNK = 10000000
+
+
+def encode_varints(values):
+    """
+    Function to encode non-negative integers as LEB128 varints, 7 bits per byte.
+    :param values: Integers to encode.
+    :return encoded: Bytes of the varints.
+    """
+
+    values = np.asarray(values, dtype=np.uint64)
+
+    # Number of bytes of every value.
+    number_of_bytes = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+
+        number_of_bytes += (remaining > 0)
+        remaining = remaining >> np.uint64(7)
+
+    starts = np.cumsum(number_of_bytes) - number_of_bytes
+    encoded = np.zeros(int(number_of_bytes.sum()), dtype=np.uint8)
+
+    # Fill the j-th byte of every value which has one, with the high bit set when more bytes follow.
+    for j in range(int(number_of_bytes.max()) if len(values) else 0):
+
+        has_byte = number_of_bytes > j
+        low_bits = (values[has_byte] >> np.uint64(7 * j)) & np.uint64(0x7f)
+        continuation = np.where(number_of_bytes[has_byte] > j + 1, 0x80, 0).astype(np.uint64)
+        encoded[starts[has_byte] + j] = (low_bits | continuation).astype(np.uint8)
+
+    return encoded.tobytes()
+
+
+def decode_varints(encoded):
+    """
+    Function to decode LEB128 varints.
+    :param encoded: Bytes of the varints (numpy uint8 array).
+    :return values: Decoded integers (int64).
+    """
+
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if len(encoded) == 0:
+
+        return np.zeros(0, dtype=np.int64)
+
+    # A value ends at every byte without the high bit.
+    ends = (encoded & 0x80) == 0
+    value_of_byte = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shifts = (np.arange(len(encoded)) - value_starts[value_of_byte]) * 7
+
+    # Document ids are far below 2 ** 53, so summing the parts as doubles is exact.
+    parts = (encoded & 0x7f).astype(np.float64) * np.exp2(shifts)
+    values = np.bincount(value_of_byte, weights=parts, minlength=int(ends.sum()))
+
+    return values.astype(np.int64)
+
+
+def load_array(index_dir, file_name, dtype):
+    """
+    Function to open a binary file of the index as a read-only memory mapped array.
+    :param index_dir: Directory of the index.
+    :param file_name: Name of the file.
+    :param dtype: Type of the array elements.
+    :return array: Memory mapped array (or an empty array for an empty file).
+    """
+
+    file_path = os.path.join(index_dir, file_name)
+
+    # Numpy can not memory map an empty file.
+    if os.path.getsize(file_path) == 0:
+
+        return np.zeros(0, dtype=dtype)
+
+    if file_name.endswith(".npy"):
+
+        return np.load(file_path, mmap_mode="r")
+
+    return np.memmap(file_path, dtype=dtype, mode="r")
+
+
+class BinaryIndexWriter(object):
+    """
+    Writer of the binary index, one word at a time in word order.
+    """
+
+    def __init__(self, index_dir, document_terms=False):
+        """
+        Function to open the files of a new binary index.
+        :param index_dir: Directory of the index.
+        :param document_terms: True to write the term numbers of every document too, for an index with deletions.
+        """
+
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.terms_file = open(os.path.join(index_dir, "terms.bin"), "wb")
+        self.doc_ids_file = open(os.path.join(index_dir, "doc_ids.bin"), "wb")
+        self.term_frequencies_file = open(os.path.join(index_dir, "term_frequencies.bin"), "wb")
+
+        # Document id of every posting, not delta encoded, to write the term numbers of every document at the end.
+        self.posting_doc_ids_file = None
+        if document_terms is True:
+
+            self.posting_doc_ids_file = open(os.path.join(index_dir, "posting_doc_ids.tmp"), "wb")
+
+        self.term_offsets = [0]
+        self.postings_offsets = [0]
+        self.document_frequencies = list()
+        self.max_term_frequencies = list()
+
+    def add_word(self, word, doc_ids, term_frequencies, norms):
+        """
+        Function to write the postings list of the next word.
+        :param word: Word, greater than every word written before.
+        :param doc_ids: Document ids in increasing order.
+        :param term_frequencies: TF of the word in every document.
+        :param norms: L2 norm of every document vector, indexed by the document id.
+        """
+
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        term_frequencies = np.asarray(term_frequencies, dtype=np.float32)
+
+        word_bytes = word.encode("utf8")
+        self.terms_file.write(word_bytes)
+        self.term_offsets.append(self.term_offsets[-1] + len(word_bytes))
+
+        # First document id as it is, then the gaps between consecutive ids.
+        encoded = encode_varints(np.diff(doc_ids, prepend=0))
+        self.doc_ids_file.write(encoded)
+        self.postings_offsets.append(self.postings_offsets[-1] + len(encoded))
+
+        self.term_frequencies_file.write(term_frequencies.tobytes())
+        if self.posting_doc_ids_file is not None:
+
+            self.posting_doc_ids_file.write(doc_ids.astype(np.uint32).tobytes())
+
+        self.document_frequencies.append(len(doc_ids))
+
+        # Bounds what the word can add to a cosine similarity, for the MaxScore search.
+        document_norms = np.asarray(norms, dtype=np.float64)[doc_ids]
+        with np.errstate(divide="ignore", invalid="ignore"):
+
+            normalized = np.where(document_norms > 0, term_frequencies / document_norms, 0)
+
+        self.max_term_frequencies.append(float(normalized.max()) if len(normalized) else 0)
+
+    def close(self, urls, norms):
+        """
+        Function to write the document table and the term dictionary, and close the index.
+        :param urls: Url of every document, indexed by the document id.
+        :param norms: L2 norm of every document vector, indexed by the document id.
+        """
+
+        self.terms_file.close()
+        self.doc_ids_file.close()
+        self.term_frequencies_file.close()
+
+        np.save(os.path.join(self.index_dir, "term_offsets.npy"), np.array(self.term_offsets, dtype=np.uint64))
+        np.save(os.path.join(self.index_dir, "postings_offsets.npy"), np.array(self.postings_offsets, dtype=np.uint64))
+        np.save(os.path.join(self.index_dir, "document_frequencies.npy"), np.array(self.document_frequencies, dtype=np.uint32))
+        np.save(os.path.join(self.index_dir, "max_term_frequencies.npy"), np.array(self.max_term_frequencies, dtype=np.float64))
+
+        url_offsets = [0]
+        all_url_bytes = list()
+        with open(os.path.join(self.index_dir, "urls.bin"), "wb") as urls_file:
+
+            for url in urls:
+
+                url_bytes = url.encode("utf8")
+                urls_file.write(url_bytes)
+                url_offsets.append(url_offsets[-1] + len(url_bytes))
+                all_url_bytes.append(url_bytes)
+
+        np.save(os.path.join(self.index_dir, "url_offsets.npy"), np.array(url_offsets, dtype=np.uint64))
+
+        # Sorted like the words, so a url is found with a binary search.
+        url_order = sorted(range(len(all_url_bytes)), key=lambda doc_id: all_url_bytes[doc_id])
+        np.save(os.path.join(self.index_dir, "url_order.npy"), np.array(url_order, dtype=np.uint32))
+
+        with open(os.path.join(self.index_dir, "document_norms.bin"), "wb") as norms_file:
+
+            norms_file.write(np.asarray(norms, dtype=np.float64).tobytes())
+
+        if self.posting_doc_ids_file is not None:
+
+            self.posting_doc_ids_file.close()
+            write_document_terms(self.index_dir, self.document_frequencies, len(urls))
+
+
+def write_document_terms(index_dir, document_frequencies, number_of_documents):
+    """
+    Function to write the term numbers of every document, so deleting a document only reads its own words.
+    The document id of every posting is read back from posting_doc_ids.tmp in word order, in chunks,
+    and every chunk is sorted by document id. The offsets are moved in place last, so a reader either
+    finds both files complete or none of them.
+    :param index_dir: Directory of the index.
+    :param document_frequencies: Number of documents of every word.
+    :param number_of_documents: Number of documents of the index.
+    """
+
+    posting_doc_ids_path = os.path.join(index_dir, "posting_doc_ids.tmp")
+    document_terms_path = os.path.join(index_dir, "document_terms.bin")
+    document_term_offsets_path = os.path.join(index_dir, "document_term_offsets.npy")
+
+    posting_doc_ids = load_array(index_dir, "posting_doc_ids.tmp", np.uint32)
+    term_offsets = np.concatenate(([0], np.cumsum(document_frequencies, dtype=np.int64)))
+    chunks = range(0, len(posting_doc_ids), POSTINGS_PER_CHUNK)
+
+    # Number of words of every document, and where its term numbers start.
+    words_per_document = np.zeros(number_of_documents, dtype=np.int64)
+    for start in chunks:
+
+        words_per_document += np.bincount(posting_doc_ids[start:start + POSTINGS_PER_CHUNK], minlength=number_of_documents)
+
+    document_term_offsets = np.concatenate(([0], np.cumsum(words_per_document)))
+
+    with open(document_terms_path + ".tmp", "wb") as document_terms_file:
+
+        document_terms_file.truncate(4 * len(posting_doc_ids))
+
+    # Next free position of every document. Chunks are in word order, so the term numbers of a document stay sorted.
+    positions = document_term_offsets[:-1].copy()
+    if len(posting_doc_ids) > 0:
+
+        document_terms = np.memmap(document_terms_path + ".tmp", dtype=np.uint32, mode="r+")
+
+        for start in chunks:
+
+            doc_ids = np.asarray(posting_doc_ids[start:start + POSTINGS_PER_CHUNK], dtype=np.int64)
+            term_numbers = np.searchsorted(term_offsets, np.arange(start, start + len(doc_ids)), side="right") - 1
+
+            # Rank of every posting among the postings of its document in the chunk.
+            order = np.argsort(doc_ids, kind="stable")
+            sorted_doc_ids = doc_ids[order]
+            group_starts = np.flatnonzero(np.concatenate(([True], sorted_doc_ids[1:] != sorted_doc_ids[:-1])))
+            ranks = np.arange(len(doc_ids)) - np.repeat(group_starts, np.diff(np.append(group_starts, len(doc_ids))))
+
+            document_terms[positions[sorted_doc_ids] + ranks] = term_numbers[order]
+            positions += np.bincount(doc_ids, minlength=number_of_documents)
+
+        document_terms.flush()
+        del document_terms
+
+    del posting_doc_ids
+    os.remove(posting_doc_ids_path)
+
+    with open(document_term_offsets_path + ".tmp", "wb") as offsets_file:
+
+        np.save(offsets_file, document_term_offsets.astype(np.uint64))
+
+    os.replace(document_terms_path + ".tmp", document_terms_path)
+    os.replace(document_term_offsets_path + ".tmp", document_term_offsets_path)
+
+
+def add_document_terms(index_dir):
+    """
+    Function to write the term numbers of every document of an index written without them, like a full build.
+    It runs once, the first time a document of the index is deleted, and decodes the postings a chunk of words at a time.
+    :param index_dir: Directory of the index.
+    """
+
+    index = BinaryIndex(index_dir)
+
+    with open(os.path.join(index_dir, "posting_doc_ids.tmp"), "wb") as posting_doc_ids_file:
+
+        first_term = 0
+        while first_term < index.number_of_words:
+
+            # Whole words, with about POSTINGS_PER_CHUNK postings.
+            last_term = int(np.searchsorted(
+                index.term_frequency_offsets, index.term_frequency_offsets[first_term] + POSTINGS_PER_CHUNK, side="right"
+            )) - 1
+            last_term = max(last_term, first_term + 1)
+
+            term_numbers, doc_ids, term_frequencies = index.all_term_frequencies(first_term, last_term)
+            posting_doc_ids_file.write(doc_ids.astype(np.uint32).tobytes())
+            first_term = last_term
+
+    write_document_terms(index_dir, index.document_frequencies, index.number_of_documents)
+
+
+class BinaryIndex(object):
+    """
+    Read-only binary index, memory mapped from its directory.
+    """
+
+    def __init__(self, index_dir):
+        """
+        Function to open the binary index.
+        :param index_dir: Directory of the index.
+        """
+
+        self.index_dir = index_dir
+
+        self.terms = load_array(index_dir, "terms.bin", np.uint8)
+        self.term_offsets = load_array(index_dir, "term_offsets.npy", np.uint64)
+        self.document_frequencies = load_array(index_dir, "document_frequencies.npy", np.uint32)
+        self.max_term_frequencies = load_array(index_dir, "max_term_frequencies.npy", np.float64)
+        self.postings_offsets = load_array(index_dir, "postings_offsets.npy", np.uint64)
+        self.doc_ids = load_array(index_dir, "doc_ids.bin", np.uint8)
+        self.term_frequencies = load_array(index_dir, "term_frequencies.bin", np.float32)
+        self.urls = load_array(index_dir, "urls.bin", np.uint8)
+        self.url_offsets = load_array(index_dir, "url_offsets.npy", np.uint64)
+        self.url_order = load_array(index_dir, "url_order.npy", np.uint32)
+        self.norms = load_array(index_dir, "document_norms.bin", np.float64)
+
+        # Term numbers of every document, None until they are written for deletions.
+        self.document_terms, self.document_term_offsets = None, None
+        if os.path.isfile(os.path.join(index_dir, "document_term_offsets.npy")):
+
+            self.document_terms = load_array(index_dir, "document_terms.bin", np.uint32)
+            self.document_term_offsets = load_array(index_dir, "document_term_offsets.npy", np.uint64)
+
+        # Start of the term frequencies of every word, since every posting has one.
+        self.term_frequency_offsets = np.concatenate(([0], np.cumsum(self.document_frequencies, dtype=np.int64)))
+
+        self.number_of_words = len(self.document_frequencies)
+        self.number_of_documents = len(self.url_offsets) - 1
+
+        # Build of the index, set when it is opened as the index of a full build.
+        self.current_index = None
+
+    def word_at(self, term_number):
+        """
+        Function to get the word of a term number.
+        :param term_number: Position of the word in the sorted term dictionary.
+        :return word: The word.
+        """
+
+        start, end = int(self.term_offsets[term_number]), int(self.term_offsets[term_number + 1])
+
+        return self.terms[start:end].tobytes().decode("utf8")
+
+    def find_word(self, word):
+        """
+        Function to find the term number of a word with a binary search over the term dictionary.
+        :param word: Word to find.
+        :return term_number: Position of the word in the term dictionary, or -1 if it is not there.
+        """
+
+        word_bytes = word.encode("utf8")
+
+        low, high = 0, self.number_of_words
+        while low < high:
+
+            middle = (low + high) // 2
+            start, end = int(self.term_offsets[middle]), int(self.term_offsets[middle + 1])
+            if self.terms[start:end].tobytes() < word_bytes:
+
+                low = middle + 1
+
+            else:
+
+                high = middle
+
+        if low < self.number_of_words and self.word_at(low) == word:
+
+            return low
+
+        return -1
+
+    def url(self, doc_id):
+        """
+        Function to get the url of a document.
+        :param doc_id: Document id.
+        :return url: Url of the document.
+        """
+
+        start, end = int(self.url_offsets[doc_id]), int(self.url_offsets[doc_id + 1])
+
+        return self.urls[start:end].tobytes().decode("utf8")
+
+    def find_url(self, url):
+        """
+        Function to find the document ids of a url with a binary search over the sorted urls.
+        :param url: Url to find.
+        :return doc_ids: Document ids of the url, empty if it is not in the index.
+        """
+
+        url_bytes = url.encode("utf8")
+
+        def url_bytes_at(position):
+
+            doc_id = int(self.url_order[position])
+            return self.urls[int(self.url_offsets[doc_id]):int(self.url_offsets[doc_id + 1])].tobytes()
+
+        low, high = 0, len(self.url_order)
+        while low < high:
+
+            middle = (low + high) // 2
+            if url_bytes_at(middle) < url_bytes:
+
+                low = middle + 1
+
+            else:
+
+                high = middle
+
+        doc_ids = list()
+        while low < len(self.url_order) and url_bytes_at(low) == url_bytes:
+
+            doc_ids.append(int(self.url_order[low]))
+            low += 1
+
+        return doc_ids
+
+    def terms_of_document(self, doc_id):
+        """
+        Function to get the term numbers of the words of a document.
+        :param doc_id: Document id.
+        :return term_numbers: Term numbers of the words of the document, in increasing order (int64).
+        """
+
+        start, end = int(self.document_term_offsets[doc_id]), int(self.document_term_offsets[doc_id + 1])
+
+        return self.document_terms[start:end].astype(np.int64)
+
+    def idf_at(self, term_number):
+        """
+        Function to get the inverse document frequency of a term number.
+        :param term_number: Position of the word in the term dictionary.
+        :return idf: Inverse document frequency of the word.
+        """
+
+        return math.log(self.number_of_documents / int(self.document_frequencies[term_number]))
+
+    def idf(self, word):
+        """
+        Function to get the inverse document frequency of a word.
+        :param word: The word.
+        :return idf: Inverse document frequency of the word, or None if it is not in the index.
+        """
+
+        term_number = self.find_word(word)
+        if term_number < 0:
+
+            return None
+
+        return self.idf_at(term_number)
+
+    def max_score(self, word):
+        """
+        Function to get the largest weight / document norm in the postings of a word.
+        :param word: The word.
+        :return max_score: Largest normalized weight of the word, 0 if it is not in the index.
+        """
+
+        term_number = self.find_word(word)
+        if term_number < 0:
+
+            return 0
+
+        return float(self.max_term_frequencies[term_number]) * self.idf_at(term_number)
+
+    def term_frequencies_at(self, term_number):
+        """
+        Function to decode the postings list of a term number, with the TF of the word in every document.
+        :param term_number: Position of the word in the term dictionary.
+        :return doc_ids: Document ids in increasing order (int64).
+        :return term_frequencies: TF of the word in every document (float64).
+        """
+
+        start, end = int(self.postings_offsets[term_number]), int(self.postings_offsets[term_number + 1])
+        doc_ids = np.cumsum(decode_varints(self.doc_ids[start:end]))
+
+        start, end = self.term_frequency_offsets[term_number], self.term_frequency_offsets[term_number + 1]
+        term_frequencies = self.term_frequencies[start:end].astype(np.float64)
+
+        return doc_ids, term_frequencies
+
+    def postings_at(self, term_number):
+        """
+        Function to decode the postings list of a term number.
+        :param term_number: Position of the word in the term dictionary.
+        :return doc_ids: Document ids in increasing order (int64).
+        :return weights: TF-IDF weight of the word in every document (float64).
+        """
+
+        doc_ids, term_frequencies = self.term_frequencies_at(term_number)
+
+        return doc_ids, term_frequencies * self.idf_at(term_number)
+
+    def postings(self, word):
+        """
+        Function to decode the postings list of a word.
+        :param word: The word.
+        :return doc_ids: Document ids in increasing order, empty if the word is not in the index.
+        :return weights: TF-IDF weight of the word in every document.
+        """
+
+        term_number = self.find_word(word)
+        if term_number < 0:
+
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        return self.postings_at(term_number)
+
+    def all_term_frequencies(self, first_term=0, last_term=None):
+        """
+        Function to decode the postings lists of a range of words at once, with the TF of every posting.
+        :param first_term: First term number of the range.
+        :param last_term: Term number after the range, or None for every word from first_term.
+        :return term_numbers: Term number of every posting.
+        :return doc_ids: Document id of every posting.
+        :return term_frequencies: TF of every posting.
+        """
+
+        if last_term is None:
+
+            last_term = self.number_of_words
+
+        document_frequencies = self.document_frequencies[first_term:last_term].astype(np.int64)
+        term_numbers = np.repeat(np.arange(first_term, last_term), document_frequencies)
+        start, end = int(self.term_frequency_offsets[first_term]), int(self.term_frequency_offsets[last_term])
+
+        # Gaps restart at the first posting of every word, so subtract the running sum before it.
+        gaps = decode_varints(self.doc_ids[int(self.postings_offsets[first_term]):int(self.postings_offsets[last_term])])
+        running_sum = np.cumsum(gaps)
+        first_postings = self.term_frequency_offsets[first_term:last_term][document_frequencies > 0] - start
+        bases = np.zeros(last_term - first_term, dtype=np.int64)
+        bases[document_frequencies > 0] = running_sum[first_postings] - gaps[first_postings]
+        doc_ids = running_sum - np.repeat(bases, document_frequencies)
+
+        return term_numbers, doc_ids, np.asarray(self.term_frequencies[start:end], dtype=np.float64)
+
+    def all_postings(self):
+        """
+        Function to decode every postings list at once.
+        :return term_numbers: Term number of every posting.
+        :return doc_ids: Document id of every posting.
+        :return weights: TF-IDF weight of every posting.
+        """
+
+        term_numbers, doc_ids, term_frequencies = self.all_term_frequencies()
+
+        with np.errstate(divide="ignore"):
+
+            idfs = np.log(self.number_of_documents / self.document_frequencies.astype(np.float64))
+
+        weights = term_frequencies * idfs[term_numbers]
+
+        return term_numbers, doc_ids, weights
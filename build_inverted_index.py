@@ -7,175 +7,218 @@
 import os
 import math
 import json
+import heapq
+import shutil
+import argparse
+import collections
+import numpy as np
+
+from binary_index import BinaryIndex
+from binary_index import BinaryIndexWriter
+from index_segments import MANIFEST_FILE
+from index_segments import SEGMENTS_DIR
+from index_segments import SegmentMerger
+from index_segments import SegmentedIndex
+from index_segments import update_index
+from index_segments import read_current_index
+from index_segments import write_current_index
+from recrawl import REPORT_FILE
+from page_rank_prior import write_page_rank_prior
 
 DATA_DIR = "./documents"
 TF_IDF_FILES_DIR = "./tf_idf_files"
+RUNS_DIR = os.path.join(TF_IDF_FILES_DIR, "runs")
 
+# Number of postings held in memory before they are written to disk as a sorted run.
+# Roughly 100 bytes per posting, so the default keeps the postings buffer around 200 MB.
+MAX_POSTINGS_IN_MEMORY = 2000000
 
-def generate_tf():
+
+def write_postings_run(postings, run_number):
 	"""
-	Function to build the corpus for every document.
-	:return tf_dict: Ter Frequency Dictionary (Mapping of documents with term frequencies of words in it).
+	Function to write the in-memory postings to disk, sorted by word.
+	:param postings: Mapping of word and its postings list of [document id, term frequency].
+	:param run_number: Number of this run.
+	:return run_file_path: Path of the written run.
 	"""
 
-	# Dictionary to store term frequency of each term in each url.
-	tf_dict = dict()
+	run_file_path = os.path.join(RUNS_DIR, "run_{}.jsonl".format(run_number))
 
-	i = 0
+	# One word and its postings per line, in word order, so the runs can be merged line by line.
+	with open(run_file_path, "w") as rf:
 
-	# Traverse through the 'documents' directory and get words for each url.
-	for json_file in os.listdir(DATA_DIR):
-		
-		# Open the file and contents.
-		with open(os.path.join(DATA_DIR, json_file), "r") as jf:
+		for word in sorted(postings.keys()):
 
-			# To store term frequency of words in each url.
-			tf_dict_each = dict()
+			rf.write(json.dumps([word, postings[word]]) + "\n")
 
-			# Load the dictionary
-			url_text_dict = dict(json.load(jf))
-			url_word_count_map = url_text_dict["WORD_COUNT_MAP"]
+	return run_file_path
 
-			# "url_word_count_map" is dictionary with word and its frequency.
-			total_words = sum(list(url_word_count_map.values()))
 
-			for word, word_count in url_word_count_map.items():
+def read_postings_run(run_file_path):
+	"""
+	Generator over the words and postings of a run written by write_postings_run.
+	:param run_file_path: Path of the run.
+	:return (word, postings): Word and its postings list, in word order.
+	"""
 
-				tf_dict_each[word] = word_count / total_words
+	with open(run_file_path, "r") as rf:
 
-			# Push individual tf_dict_each to main tf_dict
-			tf_dict[url_text_dict["URL"]] = tf_dict_each
+		for line in rf:
 
-	return tf_dict
+			word, postings = json.loads(line)
+			yield word, postings
 
 
-def generate_idf():
+def generate_postings_runs():
 	"""
-	Function to generate the inverse document frequency.
-	:return idf_dict: Inverse Document Frequency Mapping.
+	Function to read every document once and write its term frequencies to sorted postings runs.
+	:return urls: Url of every document, indexed by the document id.
+	:return document_frequency: Number of urls in which each word appears.
+	:return run_file_paths: Paths of the written runs, in document id order.
 	"""
 
-	# Total number of json files in the data directory.
-	total_pages = len(os.listdir(DATA_DIR))
+	# Document ids are integers, the position of the url in this list.
+	urls = list()
 
-	# Dicitonary to store the IDF of each document.
-	idf_dict = dict()
+	# Number of urls in which each word of the vocabulary appears.
+	document_frequency = collections.Counter()
+
+	# Postings of the documents read since the last run was written.
+	postings = dict()
+	postings_in_memory = 0
+	run_file_paths = list()
+
+	# Traverse through the 'documents' directory once, in a fixed order so document ids are stable.
+	for json_file in sorted(os.listdir(DATA_DIR)):
 
-	#######################
-	# GENARATE VOCABULARY #
-	#######################
-
-	# Vocabulary of all the words in all the urls.
-	all_words_in_all_urls = list()
-	i = 0
-	# Traverse through the 'documents' directory and get words for each url.
-	for json_file in os.listdir(DATA_DIR):
-		if i >= 200:
-			break
-		i += 1
-		
 		# Open the file and contents.
 		with open(os.path.join(DATA_DIR, json_file), "r") as jf:
 
-			# To store term frequency of words in each url.
-			tf_dict_each = dict()
-
 			# Load the dictionary
 			url_text_dict = dict(json.load(jf))
 
-			# Get all the words in this particular document/url.
-			all_words_in_this_url = list(url_text_dict["WORD_COUNT_MAP"].keys())
+		doc_id = len(urls)
+		urls.append(url_text_dict["URL"])
 
-			# Append it to main list
-			all_words_in_all_urls += all_words_in_this_url
+		# "url_word_count_map" is dictionary with word and its frequency.
+		url_word_count_map = url_text_dict["WORD_COUNT_MAP"]
+		total_words = sum(list(url_word_count_map.values()))
 
-	# Vocabulary of all urls.
-	vocabulary = set(all_words_in_all_urls)
+		for word, word_count in url_word_count_map.items():
 
-	print(len(vocabulary))
-	#################
-	# IDF OPERATION #
-	#################
-	j = 0
-	for word in vocabulary:
+			if word not in postings:
 
-		print(j)
-		j += 1
+				postings[word] = list()
 
-		# To track how many urls have this word of vocabulary.
-		word_count = 0
+			postings[word].append([doc_id, word_count / total_words])
 
-		# Traverse through the 'documents' directory and get words for each url.
-		for json_file in os.listdir(DATA_DIR):
-			
-			# Open the file and contents.
-			with open(os.path.join(DATA_DIR, json_file), "r") as jf:
+		document_frequency.update(url_word_count_map.keys())
+		postings_in_memory += len(url_word_count_map)
 
-				# To store term frequency of words in each url.
-				tf_dict_each = dict()
+		# Memory budget hit, write the postings to disk and start over.
+		if postings_in_memory >= MAX_POSTINGS_IN_MEMORY:
 
-				# Load the dictionary
-				url_text_dict = dict(json.load(jf))
+			run_file_paths.append(write_postings_run(postings, len(run_file_paths)))
+			postings = dict()
+			postings_in_memory = 0
 
-				# Get all the words in this particular document/url.
-				all_words_in_this_url = list(url_text_dict["WORD_COUNT_MAP"].keys())
+	if postings:
 
-				if word in all_words_in_this_url:
+		run_file_paths.append(write_postings_run(postings, len(run_file_paths)))
 
-					word_count += 1
+	return urls, document_frequency, run_file_paths
+
+
+def merge_postings_runs(run_file_paths):
+	"""
+	Generator merging the sorted runs into one postings list per word.
+	:param run_file_paths: Paths of the runs, in document id order.
+	:return (word, postings): Word and its postings list of [document id, term frequency], in word order.
+	"""
 
-		# Now, we know how many urls contain the word.
-		# Let's calculate idf.
-		if word_count == 0:
+	# Runs are merged by word. Ties keep the order of the runs, so the document ids stay increasing.
+	runs = [read_postings_run(run_file_path) for run_file_path in run_file_paths]
+	merged_runs = heapq.merge(*runs, key=lambda word_and_postings: word_and_postings[0])
 
-			continue
+	current_word, current_postings = None, list()
+	for word, postings in merged_runs:
 
-		else:
+		if word != current_word:
 
-			idf_dict[word] = math.log(total_pages / word_count)
+			if current_word is not None:
+
+				yield current_word, current_postings
+
+			current_word, current_postings = word, list()
+
+		current_postings += postings
+
+	if current_word is not None:
+
+		yield current_word, current_postings
+
+
+def generate_idf(document_frequency, total_pages):
+	"""
+	Function to generate the inverse document frequency.
+	:param document_frequency: Number of urls in which each word appears.
+	:param total_pages: Total number of documents.
+	:return idf_dict: Inverse Document Frequency Mapping.
+	"""
+
+	# Dicitonary to store the IDF of each document.
+	idf_dict = dict()
+
+	for word, word_count in document_frequency.items():
+
+		idf_dict[word] = math.log(total_pages / word_count)
 
 	return idf_dict
 
 
-def generate_tf_idf(tf_dict, idf_dict):
+def generate_document_norms(total_pages, idf_dict, merged_postings):
 	"""
-	Function to generate TF-IDF.
-	:return tf_idf_dict: TF-IDF Mapping.
+	Function to generate the L2 norm of every document vector.
+	:param total_pages: Total number of documents.
+	:param idf_dict: Inverse Document Frequency Mapping.
+	:param merged_postings: Words and their postings list of [document id, term frequency], in word order.
+	:return norms: L2 norm of every document vector, indexed by the document id.
 	"""
 
-	# To store TF-IDF dictionary.
-	tf_idf_dict = dict()
+	# Sum of the squared weights of every document vector.
+	norms = [0] * total_pages
 
-	# Traverse through the 'documents' directory and get words for each url.
-	for json_file in os.listdir(DATA_DIR):
-		print(json_file)
-		
-		# Open the file and contents.
-		with open(os.path.join(DATA_DIR, json_file), "r") as jf:
+	for word, postings in merged_postings:
 
-			# To store term frequency of words in each url.
-			tf_dict_each = dict()
+		idf = idf_dict[word]
+		for doc_id, tf in postings:
 
-			# Load the dictionary
-			url_text_dict = dict(json.load(jf))
+			norms[doc_id] += (tf * idf) ** 2
 
-			# Get all the words in this particular document/url.
-			all_words_in_this_url = list(url_text_dict["WORD_COUNT_MAP"].keys())
-			this_url = url_text_dict["URL"]
-			tf_idf_dict_each = dict()
+	norms = [doc_term ** (1 / 2) for doc_term in norms]
 
-			# Product of TF and IDF here.
-			for word in all_words_in_this_url:
-				try:
+	return norms
 
-					tf_idf_dict_each[word] = tf_dict[this_url][word] * idf_dict[word]
-				except:
 
-					continue
+def write_inverted_index(urls, norms, merged_postings, index_dir):
+	"""
+	Function to write the binary inverted index, one word at a time.
+	:param urls: Url of every document, indexed by the document id.
+	:param norms: L2 norm of every document vector, indexed by the document id.
+	:param merged_postings: Words and their postings list of [document id, term frequency], in word order.
+	:param index_dir: New directory of the index.
+	"""
 
-		tf_idf_dict[this_url] = tf_idf_dict_each
+	norms = np.asarray(norms, dtype=np.float64)
 
-	return tf_idf_dict
+	# The postings are streamed into the index, so only one word is held in memory at a time.
+	index_writer = BinaryIndexWriter(index_dir)
+	for word, postings in merged_postings:
+
+		postings = np.asarray(postings, dtype=np.float64)
+		index_writer.add_word(word, postings[:, 0].astype(np.int64), postings[:, 1], norms)
+
+	index_writer.close(urls, norms)
 
 
 def create_directory():
@@ -193,7 +236,7 @@ def create_directory():
 	else:
 
 		try:
-			
+
 			os.mkdir(TF_IDF_FILES_DIR)
 			print("Directory created to store the tf-idf files.")
 			return True
@@ -213,29 +256,103 @@ def create_vector_space_model():
 	# If no, create one.
 	if create_directory() is True:
 
-		# Generate Term Frequency and save json.
-		tf_dict = generate_tf()
-		with open(os.path.join(TF_IDF_FILES_DIR, 'tf.json'), 'w') as fp:
+		os.makedirs(RUNS_DIR, exist_ok=True)
+
+		# Searchers keep the files of the last build mapped, so every build writes its index to a new directory.
+		previous_index = read_current_index(TF_IDF_FILES_DIR)
+		current_index = {"BUILD": previous_index["BUILD"] + 1, "PATH": "index_{}".format(previous_index["BUILD"] + 1)}
+		index_dir = os.path.join(TF_IDF_FILES_DIR, current_index["PATH"])
 
-		    json.dump(tf_dict, fp)
+		# Left over by a build which did not finish.
+		shutil.rmtree(index_dir, ignore_errors=True)
 
+		# Read every document once, writing sorted postings runs whenever the memory budget is hit.
+		urls, document_frequency, run_file_paths = generate_postings_runs()
+		print("Documents read into {} postings runs.".format(len(run_file_paths)))
 
-		# Generate Inverse Document Frequency and save json.
-		idf_dict = generate_idf()
-		with open(os.path.join(TF_IDF_FILES_DIR, 'idf.json'), 'w') as fp:
+		# Generate Inverse Document Frequency for the document norms.
+		idf_dict = generate_idf(document_frequency, len(urls))
 
-		    json.dump(idf_dict, fp)
+		# Merge the runs twice, first for the document norms and then to write the postings.
+		norms = generate_document_norms(len(urls), idf_dict, merge_postings_runs(run_file_paths))
+		write_inverted_index(urls, norms, merge_postings_runs(run_file_paths), index_dir)
 
+		# The runs are not needed once they are merged.
+		shutil.rmtree(RUNS_DIR)
 
-		# Generate TF-IDF and save json.
-		tf_idf_dict = generate_tf_idf(tf_dict, idf_dict)
-		with open(os.path.join(TF_IDF_FILES_DIR, 'tf_idf.json'), 'w') as fp:
+		# Page ranks of the new document ids, written before the new index is searchable.
+		inverted_index = BinaryIndex(index_dir)
+		inverted_index.current_index = current_index
+		write_page_rank_prior(TF_IDF_FILES_DIR, inverted_index=inverted_index)
 
-		    json.dump(tf_idf_dict, fp)
+		# The new index is searchable once the current index file is replaced.
+		write_current_index(TF_IDF_FILES_DIR, current_index)
+
+		# A full build replaces every segment of the incremental updates. Until the manifest is removed,
+		# searchers keep opening the old segments, which are removed only after it.
+		if os.path.isfile(os.path.join(TF_IDF_FILES_DIR, MANIFEST_FILE)):
+
+			os.remove(os.path.join(TF_IDF_FILES_DIR, MANIFEST_FILE))
+
+		shutil.rmtree(os.path.join(TF_IDF_FILES_DIR, SEGMENTS_DIR), ignore_errors=True)
+
+		# Searchers which mapped the files of the old index keep them after they are removed.
+		if previous_index["PATH"] != current_index["PATH"]:
+
+			shutil.rmtree(os.path.join(TF_IDF_FILES_DIR, previous_index["PATH"]), ignore_errors=True)
 
 	else:
 
 		raise Exception("DirectoryCreationError: Could not create directory to store TF-IDF related files.")
 
 
-create_vector_space_model()
+def write_generation_page_rank_prior(manifest):
+	"""
+	Function to write the page rank prior of the document ids of a new generation, before its manifest is committed.
+	:param manifest: Manifest of the generation, with its files written.
+	"""
+
+	write_page_rank_prior(TF_IDF_FILES_DIR, inverted_index=SegmentedIndex(TF_IDF_FILES_DIR, manifest))
+
+
+def update_vector_space_model():
+	"""
+	Driver function to update the index with the documents added, changed and removed by the last incremental crawl.
+	The update is searchable once it is committed, then the segments are merged in the background.
+	"""
+
+	with open(REPORT_FILE, "r") as rf:
+
+		report = json.load(rf)
+
+	# A changed document is deleted from its segment and added again.
+	document_numbers = [document_number for document_number, url in report["ADDED"] + report["CHANGED"]]
+	urls_to_delete = [url for document_number, url in report["CHANGED"] + report["REMOVED"]]
+
+	# Every generation gets the page ranks of its document ids before it is committed.
+	manifest = update_index(document_numbers, urls_to_delete, TF_IDF_FILES_DIR, DATA_DIR, write_generation_page_rank_prior)
+	print("Index generation {} is searchable with {} segments.".format(manifest["GENERATION"], len(manifest["SEGMENTS"])))
+
+	segment_merger = SegmentMerger(TF_IDF_FILES_DIR, write_generation_page_rank_prior)
+	segment_merger.start()
+	segment_merger.join()
+
+
+# Main funciton starts here..
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Inverted Index for Search Engine")
+	parser.add_argument(
+		"--incremental",
+		action="store_true",
+		help="Update the index with the documents of the last incremental crawl instead of building it again."
+	)
+	args = parser.parse_args()
+
+	if args.incremental:
+
+		update_vector_space_model()
+
+	else:
+
+		create_vector_space_model()
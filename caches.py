@@ -0,0 +1,430 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from nltk.stem import PorterStemmer
+
+try:
+
+    import fcntl
+
+except ImportError:
+
+    # Without file locks (Windows), only the development server saves the stems, from a single process.
+    fcntl = None
+
+# Words whose stems are kept in memory. The words of a text are Zipfian, so a few thousand of them cover most tokens.
+STEM_CACHE_SIZE = 100000
+
+# Stems saved by the query server, so it starts with the stems of the words it saw before.
+STEM_CACHE_FILE = "./stem_cache.json"
+
+# Search results kept in memory, and the seconds they stay valid (None to keep them until evicted).
+RESULT_CACHE_SIZE = 10000
+RESULT_CACHE_TTL = 3600
+
+# Bytes of decoded postings kept in memory by the searcher.
+POSTINGS_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class StemCache(object):
+    """
+    Bounded word -> stem mapping in front of the Porter Stemmer.
+    When it is full, the least recently used word is evicted. Hits and misses are counted.
+    """
+
+    def __init__(self, max_size=STEM_CACHE_SIZE):
+        """
+        Function to create an empty stem cache.
+        :param max_size: Most words kept in the cache.
+        """
+
+        self.max_size = max_size
+        self.stemmer = PorterStemmer()
+        self.hits = 0
+        self.misses = 0
+
+        # Words and their stems, from the least to the most recently used.
+        self.stems = OrderedDict()
+
+        # Searches of the query server stem words from several threads.
+        self.lock = threading.Lock()
+
+    def stem(self, word):
+        """
+        Function to stem a word, with the Porter Stemmer only if it is not cached.
+        :param word: Word to stem.
+        :return stem: Stem of the word.
+        """
+
+        with self.lock:
+
+            stem = self.stems.get(word)
+            if stem is not None:
+
+                self.hits += 1
+                self.stems.move_to_end(word)
+                return stem
+
+            self.misses += 1
+
+        stem = self.stemmer.stem(word)
+
+        with self.lock:
+
+            self.stems[word] = stem
+            if len(self.stems) > self.max_size:
+
+                self.stems.popitem(last=False)
+
+        return stem
+
+    def statistics(self):
+        """
+        Function to get the counters of the cache.
+        :return statistics: Number of cached words, hits, misses and hit rate.
+        """
+
+        with self.lock:
+
+            lookups = self.hits + self.misses
+
+            return {
+                "SIZE": len(self.stems),
+                "HITS": self.hits,
+                "MISSES": self.misses,
+                "HIT_RATE": self.hits / lookups if lookups > 0 else 0.0
+            }
+
+    def save(self, cache_file=STEM_CACHE_FILE):
+        """
+        Function to add the cached words and their stems to the saved ones, from the least to the most recently used.
+        Every worker process of the query server saves its stems when it exits, so the words saved by the
+        others are kept, as less recently used than the words of this cache.
+        :param cache_file: Path of the JSON file.
+        """
+
+        with self.lock:
+
+            stems = list(self.stems.items())
+
+        # Workers exiting together save one at a time, so none of them writes over the stems of another.
+        with open(cache_file + ".lock", "a") as lock_file:
+
+            if fcntl is not None:
+
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            saved_stems = OrderedDict(read_saved_stems(cache_file))
+            for word, stem in stems:
+
+                saved_stems[word] = stem
+                saved_stems.move_to_end(word)
+
+            # Written aside and moved over the old file, so a reader never sees half of it.
+            temporary_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(temporary_file, "w") as cf:
+
+                json.dump(list(saved_stems.items())[-self.max_size:], cf)
+
+            os.replace(temporary_file, cache_file)
+
+    def load(self, cache_file=STEM_CACHE_FILE):
+        """
+        Function to add the words and stems of a saved cache, if there is one.
+        :param cache_file: Path of the JSON file.
+        :return loaded: Whether a saved cache was found.
+        """
+
+        if os.path.isfile(cache_file) is False:
+
+            return False
+
+        stems = read_saved_stems(cache_file)
+
+        with self.lock:
+
+            # Only the most recently used words fit when the saved cache is larger.
+            for word, stem in stems[-self.max_size:]:
+
+                self.stems[word] = stem
+                self.stems.move_to_end(word)
+
+            while len(self.stems) > self.max_size:
+
+                self.stems.popitem(last=False)
+
+        return True
+
+
+def read_saved_stems(cache_file=STEM_CACHE_FILE):
+    """
+    Function to read the saved words and their stems.
+    :param cache_file: Path of the JSON file.
+    :return stems: List of [word, stem] from the least to the most recently used, empty if nothing was saved.
+    """
+
+    if os.path.isfile(cache_file) is False:
+
+        return list()
+
+    with open(cache_file, "r") as cf:
+
+        return json.load(cf)
+
+
+class QueryResultCache(object):
+    """
+    Bounded mapping of queries to their search results, with least recently used eviction.
+    Results older than the time to live are dropped when they are looked up. Hits, misses,
+    expired results and invalidations are counted.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE, time_to_live=RESULT_CACHE_TTL):
+        """
+        Function to create an empty result cache.
+        :param max_size: Most results kept in the cache.
+        :param time_to_live: Seconds a result stays valid, or None to keep it until it is evicted.
+        """
+
+        self.max_size = max_size
+        self.time_to_live = time_to_live
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+        # Keys and (time stored, results), from the least to the most recently used.
+        self.results = OrderedDict()
+
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Function to look the results of a query up.
+        :param key: Key of the query.
+        :return results: Cached results, or None if they are not cached or expired.
+        """
+
+        with self.lock:
+
+            entry = self.results.get(key)
+            if entry is not None and self.time_to_live is not None and time.monotonic() - entry[0] > self.time_to_live:
+
+                del self.results[key]
+                self.expired += 1
+                entry = None
+
+            if entry is None:
+
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.results.move_to_end(key)
+
+            return entry[1]
+
+    def put(self, key, results):
+        """
+        Function to cache the results of a query.
+        :param key: Key of the query.
+        :param results: Results of the query. They are shared with every later hit, so they are not modified.
+        """
+
+        with self.lock:
+
+            self.results[key] = (time.monotonic(), results)
+            self.results.move_to_end(key)
+
+            if len(self.results) > self.max_size:
+
+                self.results.popitem(last=False)
+
+    def clear(self):
+        """
+        Function to drop every cached result, when the index they come from is replaced.
+        """
+
+        with self.lock:
+
+            self.results.clear()
+            self.invalidations += 1
+
+    def statistics(self):
+        """
+        Function to get the counters of the cache.
+        :return statistics: Number of cached results, hits, misses, hit rate, expired results and invalidations.
+        """
+
+        with self.lock:
+
+            lookups = self.hits + self.misses
+
+            return {
+                "SIZE": len(self.results),
+                "HITS": self.hits,
+                "MISSES": self.misses,
+                "HIT_RATE": self.hits / lookups if lookups > 0 else 0.0,
+                "EXPIRED": self.expired,
+                "INVALIDATIONS": self.invalidations
+            }
+
+
+class PostingsCache(object):
+    """
+    Index in front of another one, keeping the decoded postings of the words searched recently,
+    with their IDF and max score, so a cached word is never looked up in the index again.
+    The decoded postings take at most max_bytes, and the least recently used words are evicted first.
+    Everything else is read from the index behind it.
+    """
+
+    def __init__(self, inverted_index, max_bytes=POSTINGS_CACHE_BYTES):
+        """
+        Function to create an empty postings cache in front of an index.
+        :param inverted_index: Binary index, or the segments of an index updated incrementally.
+        :param max_bytes: Most bytes of decoded document ids and weights kept in the cache.
+        """
+
+        self.inverted_index = inverted_index
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Words and their decoded postings, IDF and max score, from the least to the most recently used.
+        self.cached_words = OrderedDict()
+
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        """
+        Function to read everything else from the index behind the cache.
+        :param name: Name of the attribute.
+        :return attribute: Attribute of the index.
+        """
+
+        return getattr(self.inverted_index, name)
+
+    def postings(self, word):
+        """
+        Function to get the decoded postings list of a word, decoding it only if it is not cached.
+        :param word: The word.
+        :return doc_ids: Document ids in increasing order, empty if the word is not in the index.
+        :return weights: TF-IDF weight of the word in every document.
+        """
+
+        with self.lock:
+
+            cached_word = self.cached_words.get(word)
+            if cached_word is not None:
+
+                self.hits += 1
+                self.cached_words.move_to_end(word)
+                return cached_word["POSTINGS"]
+
+            self.misses += 1
+
+        doc_ids, weights = self.inverted_index.postings(word)
+        postings_bytes = doc_ids.nbytes + weights.nbytes
+
+        # Words which are not in the index are cheap to look up, and postings larger than the budget are not kept.
+        if postings_bytes == 0 or postings_bytes > self.max_bytes:
+
+            return doc_ids, weights
+
+        # Cached postings are shared by every search, so they are read-only.
+        doc_ids.flags.writeable = False
+        weights.flags.writeable = False
+
+        with self.lock:
+
+            if word not in self.cached_words:
+
+                self.cached_words[word] = {"POSTINGS": (doc_ids, weights), "BYTES": postings_bytes}
+                self.cached_bytes += postings_bytes
+
+            while self.cached_bytes > self.max_bytes:
+
+                self.cached_bytes -= self.cached_words.popitem(last=False)[1]["BYTES"]
+                self.evictions += 1
+
+        return doc_ids, weights
+
+    def get_word_value(self, word, name, get_value):
+        """
+        Function to get a value of a word, kept with its postings once it is computed.
+        :param word: The word.
+        :param name: Name of the value.
+        :param get_value: Function computing the value from the index.
+        :return value: Value of the word.
+        """
+
+        with self.lock:
+
+            cached_word = self.cached_words.get(word)
+            if cached_word is not None and name in cached_word:
+
+                return cached_word[name]
+
+        value = get_value(word)
+
+        # Only words with cached postings keep their values.
+        with self.lock:
+
+            cached_word = self.cached_words.get(word)
+            if cached_word is not None:
+
+                cached_word[name] = value
+
+        return value
+
+    def idf(self, word):
+        """
+        Function to get the Inverse Document Frequency of a word.
+        :param word: The word.
+        :return idf: IDF of the word, or None if it is not in the index.
+        """
+
+        return self.get_word_value(word, "IDF", self.inverted_index.idf)
+
+    def max_score(self, word):
+        """
+        Function to get the largest weight / document norm in the postings of a word.
+        :param word: The word.
+        :return max_score: Largest normalized weight of the word, 0 if it is not in the index.
+        """
+
+        return self.get_word_value(word, "MAX_SCORE", self.inverted_index.max_score)
+
+    def statistics(self):
+        """
+        Function to get the counters of the cache.
+        :return statistics: Number of cached words, bytes used out of the budget, hits, misses, hit rate and evictions.
+        """
+
+        with self.lock:
+
+            lookups = self.hits + self.misses
+
+            return {
+                "SIZE": len(self.cached_words),
+                "BYTES": self.cached_bytes,
+                "MAX_BYTES": self.max_bytes,
+                "HITS": self.hits,
+                "MISSES": self.misses,
+                "HIT_RATE": self.hits / lookups if lookups > 0 else 0.0,
+                "EVICTIONS": self.evictions
+            }
+
+
+# Stem cache shared by the preprocessing of the documents and of the queries, one per process.
+STEM_CACHE = StemCache()
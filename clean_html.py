@@ -8,10 +8,17 @@ import re
 import urllib
 from bs4 import BeautifulSoup
 from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
 from http.cookiejar import CookieJar
 from nltk.tokenize import word_tokenize
 
+from caches import STEM_CACHE
+
+# Stopwords, loaded once per process by initialize_text_processing.
+STOP_WORDS = None
+
+# Everything which is not a letter, removed from every token.
+NON_LETTERS = re.compile('[^A-Za-z]+')
+
 
 def extract_text_from_page(url):
 	"""
@@ -30,7 +37,18 @@ def extract_text_from_page(url):
 	opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cj))
 	response = opener.open(url_request)
 	raw_response = response.read().decode('utf8', errors='ignore')
-	soup = BeautifulSoup(raw_response, "lxml")
+
+	return extract_text_from_html(raw_response)
+
+
+def extract_text_from_html(html):
+	"""
+	Function to extract text data from the HTML of a webpage which is already fetched.
+	:param html: HTML of the webpage.
+	:return text_data: Extracted text.
+	"""
+
+	soup = BeautifulSoup(html, "lxml")
 
 	# Kill all script and style elements.
 	for script in soup(['style', 'script', 'head', 'title', 'meta', '[document]']):
@@ -51,42 +69,102 @@ def extract_text_from_page(url):
 	return text_data
 
 
-def preprocess_text(text_data):
+def initialize_text_processing():
 	"""
-	Function to preprocess the text data.
-	:param text_data: Text to be preprocessed.
-	:return corpus: Preprocessed text.
+	Function to load the stopwords, once per process.
+	It is also the initializer of the worker processes which preprocess documents.
+	"""
+
+	global STOP_WORDS
+
+	STOP_WORDS = set(stopwords.words("english"))
+
+	# The tokenizer loads its models on its first call.
+	word_tokenize("")
+
+
+def get_stop_words():
+	"""
+	Function to get the stopwords, loading them on the first call in this process.
+	:return stopWords: Set of stopwords.
+	"""
+
+	if STOP_WORDS is None:
+
+		initialize_text_processing()
+
+	return STOP_WORDS
+
+
+def generate_terms(tokens, stopWords, ps):
 	"""
+	Generator normalizing tokens into terms, one token at a time, without building intermediate lists.
+	Every token goes through the same steps as before: special chars removed and lowercase, stopwords removed
+	before stemming, Porter Stemmer, stopwords removed after stemming, and words of 2 letters or less removed.
+	:param tokens: Tokens of the text.
+	:param stopWords: Set of stopwords.
+	:param ps: Porter Stemmer, or a stem cache in front of it.
+	:return term: Terms of the text, in order.
+	"""
+
+	remove_non_letters = NON_LETTERS.sub
+	stem = ps.stem
+
+	# Term of every token already seen in this text, None if it is dropped. Most tokens of a text repeat.
+	token_terms = dict()
+
+	for token in tokens:
+
+		if token in token_terms:
 
-	# Some initializations.
-	stopWords = set(stopwords.words("english"))
-	ps = PorterStemmer()
+			term = token_terms[token]
 
-	# Tokenize text contents
-	contents = word_tokenize(text_data)
+		else:
 
-	# To store the corpus of words
-	corpus = list()
+			# Tokens made only of letters, most of them, do not need the regular expression.
+			if token.isascii() and token.isalpha():
 
-	# Create corpus, remove special chars and lowercase operation.
-	for content in contents:
+				word = token.lower()
 
-		content = re.sub('[^A-Za-z]+', '', content).lower()
-		corpus.append(content)
+			else:
 
-	# Remove Stopwords before stemming
-	corpus = [word for word in corpus if word not in stopWords]
+				word = remove_non_letters('', token).lower()
 
-	# Integrate Porter Stemmer
-	corpus = [ps.stem(word) for word in corpus]
+			term = None
 
-	# Remove Stopwords after stemming
-	corpus = [word for word in corpus if word not in stopWords]
+			# Empty words stay empty when stemmed, so they are dropped before.
+			if word != '' and word not in stopWords:
 
-	# Remove unnecessary empty strings from corpus
-	corpus = [word for word in corpus if word != '' and len(word) > 2]
+				word = stem(word)
+				if len(word) > 2 and word not in stopWords:
 
-	# Convert back to string
-	corpus = " ".join(corpus)
+					term = word
+
+			token_terms[token] = term
+
+		if term is not None:
+
+			yield term
+
+
+def generate_text_terms(text_data):
+	"""
+	Generator of the terms of a text, after tokenizing it.
+	:param text_data: Text to be preprocessed.
+	:return term: Terms of the text, in order.
+	"""
+
+	stopWords = get_stop_words()
+
+	# Stems of the words already seen by this process are cached.
+	return generate_terms(word_tokenize(text_data), stopWords, STEM_CACHE)
+
+
+def preprocess_text(text_data):
+	"""
+	Function to preprocess the text data.
+	:param text_data: Text to be preprocessed.
+	:return corpus: Preprocessed text.
+	"""
 
-	return corpus
+	return " ".join(generate_text_terms(text_data))
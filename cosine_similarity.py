@@ -5,19 +5,42 @@
 """
 
 import os
-import json
+import numpy as np
 
+from binary_index import BinaryIndex
+from index_segments import MANIFEST_FILE
+from index_segments import SegmentedIndex
+from index_segments import read_current_index
 from queries_cleaning_processing import queries_cleaning
 
 TF_IDF_FILES_DIR = "./tf_idf_files"
 DATA_DIR = "./documents"
 
-def cosineSimilarityCalculator(documents_TFIDF_dict, queries_TFIDF_dict):
+def load_inverted_index(tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to open the binary inverted index, or its segments once it was updated incrementally.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return inverted_index: Memory mapped binary index with document urls, norms and postings of every word.
+    """
+
+    if os.path.isfile(os.path.join(tf_idf_files_dir, MANIFEST_FILE)):
+
+        return SegmentedIndex(tf_idf_files_dir)
+
+    current_index = read_current_index(tf_idf_files_dir)
+    inverted_index = BinaryIndex(os.path.join(tf_idf_files_dir, current_index["PATH"]))
+    inverted_index.current_index = current_index
+
+    return inverted_index
+
+
+def cosineSimilarityCalculator(inverted_index, queries_TFIDF_dict, k=None):
     """
     Function to calculate the cosine similarity between documents and the queries.
-    :param documents_TFIDF_dict: TF-IDF Map of all the urls.
+    :param inverted_index: Binary index with document urls, norms and postings of every word.
     :param queries_TFIDF_dict: TF-IDF Map of all the queries.
-    :return queries_documents_similarity: Cosine Similarity (CS) score between documents and urls.
+    :param k: Number of most similar urls to keep for each query. If None, every matching url is kept.
+    :return queries_documents_similarity: Mapping of query and its list of (url, CS score) in descending order of the score.
     """
 
     # To store the CS score.
@@ -25,118 +48,285 @@ def cosineSimilarityCalculator(documents_TFIDF_dict, queries_TFIDF_dict):
 
     for query, query_words_and_weight_dict in queries_TFIDF_dict.items():
 
-        query_documents_similarity = dict()
-        for document, document_words_and_weights_dict in documents_TFIDF_dict.items():
+        if k is None:
 
-            # Find intersection. If there is atleast one word in common, get CS score.
-            intersection = [i for i in list(query_words_and_weight_dict.keys()) if
-                            i in list(document_words_and_weights_dict.keys())]
+            query_documents_similarity = get_query_similarity(inverted_index, query_words_and_weight_dict)
 
-            # If there is no word in common between doc and query, do not calculate CS score for the doc.
-            if len(intersection) == 0:
+        else:
 
-                continue
+            query_documents_similarity = get_top_k_similar_documents(inverted_index, query_words_and_weight_dict, k)
 
-            # Else perform and calculate CS score.
-            else:
+        if len(query_documents_similarity) != 0:
 
-                try:
+            queries_documents_similarity[query] = [
+                (inverted_index.url(doc_id), cosine_similarity) for cosine_similarity, doc_id in query_documents_similarity
+            ]
+
+    return queries_documents_similarity
 
-                    # Formula: Similarity(A,B) = (A.B)/((||A||)*(||B||)).
-                    # Therefore, numerator is (A.B) and denominator is ((||A||)*(||B||)).
 
-                    # Calculate the numerator.
-                    numerator = 0
-                    for commonWord in intersection:
+def get_query_norm(query_words_and_weight_dict):
+    """
+    Function to calculate the L2 norm of a query vector.
+    :param query_words_and_weight_dict: TF-IDF Map of the query.
+    :return query_term: L2 norm of the query.
+    """
 
-                        numerator += query_words_and_weight_dict[commonWord] * document_words_and_weights_dict[commonWord]
+    query_term = 0
+    for queryWord, word_weights in query_words_and_weight_dict.items():
 
-                    # Calculate the denominator
-                    doc_term = 0
-                    for doc_words, word_weights in document_words_and_weights_dict.items():
+        query_term += (word_weights) ** 2
 
-                        doc_term += (word_weights) ** 2
+    query_term = (query_term) ** (1 / 2)
 
-                    doc_term = (doc_term) ** (1 / 2)
-                    query_term = 0
-                    for queryWord, word_weights in query_words_and_weight_dict.items():
+    return query_term
 
-                        query_term += (word_weights) ** 2
 
-                    query_term = (query_term) ** (1 / 2)
-                    denominator = doc_term * query_term
-                    cosine_similarity = numerator / denominator
+def get_query_postings(inverted_index, query_words_and_weight_dict, scale):
+    """
+    Function to gather the postings of the query words, with what every posting adds to the score of its document.
+    :param inverted_index: Binary index with document urls, norms, postings and max scores of every word.
+    :param query_words_and_weight_dict: TF-IDF Map of the query.
+    :param scale: Factor of every product, like 1 / query norm.
+    :return query_postings: List of (score bound, document ids, contributions) of the query words found in the index.
+    """
 
-                except:
+    query_postings = list()
+    for queryWord, word_weights in query_words_and_weight_dict.items():
 
-                    continue
+        doc_ids, weights = inverted_index.postings(queryWord)
+        if len(doc_ids) == 0:
 
-            index = '(' + str(query) + ',' + str(document) + ')'
-            query_documents_similarity[index] = cosine_similarity
+            continue
 
-        # Sort the similarities in descending order
-        query_documents_similarity = sorted(query_documents_similarity.items(), key=lambda kv: kv[1])[::-1]
-        temp = dict()
-        for x in query_documents_similarity:
+        # Only the norms of the documents in the postings are read.
+        # A zero weight can never make a document similar, and a zero norm only has zero weights,
+        # like a deleted document, so those postings are dropped.
+        document_norms = np.asarray(inverted_index.norms[doc_ids], dtype=np.float64)
+        similar = (document_norms != 0) & (weights != 0)
+        if word_weights == 0 or not similar.any():
 
-            temp[x[0]] = x[1]
+            continue
 
-        if len(temp) != 0:
+        contributions = (scale * word_weights) * weights[similar] / document_norms[similar]
 
-            queries_documents_similarity[query] = temp
+        # The max score of the word bounds what it can add to the score of any document.
+        bound = scale * word_weights * inverted_index.max_score(queryWord)
+        query_postings.append((bound, doc_ids[similar], contributions))
 
-    return queries_documents_similarity
+    return query_postings
 
 
-def get_top_200_similar_urls():
+def add_postings(doc_ids, scores, new_doc_ids, new_scores):
     """
-    Function to get the top 200 relevant urls for the queries.
+    Function to add the scores of the postings of a word to the scores of the documents.
+    Both lists are sorted, so they are merged in one pass, and only their documents are visited, never every document of the index.
+    :param doc_ids: Document ids in increasing order.
+    :param scores: Score of every one of those documents.
+    :param new_doc_ids: Document ids of the postings, in increasing order.
+    :param new_scores: Score of every posting.
+    :return doc_ids: Document ids of both lists, in increasing order.
+    :return scores: Summed score of every one of those documents.
     """
 
-    # Get all the urls sorted in the relevance order.
-    retrieved_urls_in_relevance_order = get_cosine_similarity()
+    if len(doc_ids) == 0:
 
-    # Dictionary to store query numbers and their top 200 matching urls
-    top_urls_math_map = dict()
+        return new_doc_ids, np.asarray(new_scores, dtype=np.float64)
+
+    # A stable sort of two sorted lists is a merge of them.
+    doc_ids = np.concatenate([doc_ids, new_doc_ids])
+    order = np.argsort(doc_ids, kind="stable")
+    doc_ids = doc_ids[order]
+
+    # A document in both lists gets the sum of its two scores.
+    starts = np.flatnonzero(np.concatenate([[True], doc_ids[1:] != doc_ids[:-1]]))
+    scores = np.add.reduceat(np.concatenate([scores, new_scores])[order], starts)
+
+    return doc_ids[starts], scores
+
+
+def get_document_similarities(inverted_index, query_words_and_weight_dict):
+    """
+    Function to calculate the cosine similarity between a single query and every document sharing a word with it.
+    :param inverted_index: Binary index with document urls, norms and postings of every word.
+    :param query_words_and_weight_dict: TF-IDF Map of the query.
+    :return doc_ids: Document ids with a similarity, in increasing order.
+    :return similarities: CS score of every one of those documents.
+    """
+
+    # Formula: Similarity(A,B) = (A.B)/((||A||)*(||B||)).
+    # The query norm is the same for every document, so calculate it once.
+    query_term = get_query_norm(query_words_and_weight_dict)
+
+    doc_ids, similarities = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    # If the query has no weight, no document can be similar to it.
+    if query_term == 0:
+
+        return doc_ids, similarities
+
+    # Sum the products of every document in the postings of the query words, already divided by the norms.
+    for bound, word_doc_ids, contributions in get_query_postings(inverted_index, query_words_and_weight_dict, 1 / query_term):
+
+        doc_ids, similarities = add_postings(doc_ids, similarities, word_doc_ids, contributions)
+
+    return doc_ids, similarities
+
+
+def get_query_similarity(inverted_index, query_words_and_weight_dict):
+    """
+    Function to calculate the cosine similarity between every matching document and a single query.
+    :param inverted_index: Binary index with document urls, norms and postings of every word.
+    :param query_words_and_weight_dict: TF-IDF Map of the query.
+    :return query_documents_similarity: List of (CS score, document id) in descending order of the score.
+    """
+
+    doc_ids, similarities = get_document_similarities(inverted_index, query_words_and_weight_dict)
+
+    # Sort the similarities in descending order
+    query_documents_similarity = sorted(zip(similarities.tolist(), doc_ids.tolist()), reverse=True)
+
+    return query_documents_similarity
 
-    # Sorry for the huge variable names. But it makes sense.
-    for query_number, retrieved_urls_similarity_score_map in retrieved_urls_in_relevance_order.items():
 
-        top_urls = list()
+def get_kth_score(scores, k):
+    """
+    Function to get the k-th largest score.
+    :param scores: Array of scores.
+    :param k: Rank of the score.
+    :return kth_score: The k-th largest score, or None if there are less than k scores.
+    """
+
+    if len(scores) < k:
+
+        return None
+
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+def get_top_k_similar_documents(inverted_index, query_words_and_weight_dict, k, prior=None, relevance_weight=1.0, prior_weight=0.0):
+    """
+    Function to get the k documents most similar to a single query, with MaxScore pruning.
+    The words are scored one postings list at a time, from the largest max score to the smallest.
+    Once the k-th best score so far is above what the remaining words can give a new document,
+    those words are only looked up for the documents which can still reach the top k.
+    With a prior, the score of a document is relevance_weight * CS score + prior_weight * prior of the document.
+    :param inverted_index: Binary index with document urls, norms, postings and max scores of every word.
+    :param query_words_and_weight_dict: TF-IDF Map of the query.
+    :param k: Number of documents to get.
+    :param prior: Array of a score between 0 and 1 for every document id, like its page rank, or None for the CS score only.
+    :param relevance_weight: Positive weight of the CS score, when there is a prior.
+    :param prior_weight: Weight of the prior.
+    :return top_documents: List of at most k (score, document id) in descending order of the score.
+    """
+
+    query_term = get_query_norm(query_words_and_weight_dict)
+    if k <= 0 or query_term == 0:
+
+        return list()
+
+    if prior is None:
+
+        relevance_weight, prior_weight = 1.0, 0.0
+
+    # Words with the largest max score first, and the most the words after each one can add to a score.
+    query_postings = sorted(
+        get_query_postings(inverted_index, query_words_and_weight_dict, relevance_weight / query_term),
+        key=lambda word_postings: word_postings[0], reverse=True
+    )
+    remaining_bounds = np.cumsum([0] + [bound for bound, doc_ids, contributions in reversed(query_postings)])[::-1]
+
+    # The prior is between 0 and 1, so it adds at most prior_weight to a score.
+    prior_bound = max(prior_weight, 0)
+
+    # Candidates with the CS score known so far and their prior.
+    doc_ids, similarities, priors = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float64)
+    word_number = 0
+    while word_number < len(query_postings):
+
+        # A document in none of the words scored so far can not beat the k-th score any more.
+        kth_score = get_kth_score(similarities + priors, k)
+        if kth_score is not None and kth_score >= remaining_bounds[word_number] + prior_bound:
+
+            break
+
+        bound, word_doc_ids, contributions = query_postings[word_number]
+        doc_ids, similarities = add_postings(doc_ids, similarities, word_doc_ids, contributions)
+
+        # Only the prior of the candidates is read.
+        if prior is not None:
 
-        # Get top 200 urls.
-        all_urls = list(retrieved_urls_similarity_score_map.keys())[:200]
+            priors = prior_weight * np.asarray(prior[doc_ids], dtype=np.float64)
 
-        for url in all_urls:
+        else:
+
+            priors = np.zeros(len(doc_ids), dtype=np.float64)
+
+        word_number += 1
+
+    # The remaining words are only looked up for the candidates, dropping those which can not reach the top k any more.
+    for bound, word_doc_ids, contributions in query_postings[word_number:]:
+
+        scores = similarities + priors
+        candidates = scores + remaining_bounds[word_number] >= get_kth_score(scores, k)
+        doc_ids, similarities, priors = doc_ids[candidates], similarities[candidates], priors[candidates]
+
+        positions = np.minimum(np.searchsorted(word_doc_ids, doc_ids), len(word_doc_ids) - 1)
+        found = word_doc_ids[positions] == doc_ids
+        similarities[found] += contributions[positions[found]]
+        word_number += 1
+
+    # Documents without any similarity are never candidates, whatever their prior.
+    scores = similarities + priors
+
+    # Partition the k best scores to the front, without sorting the others.
+    if len(scores) > k:
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        doc_ids, scores = doc_ids[top], scores[top]
+
+    # Only the k kept documents are sorted.
+    top_documents = sorted(zip(scores.tolist(), doc_ids.tolist()), reverse=True)
+
+    return top_documents
+
+
+def get_top_200_similar_urls(inverted_index=None):
+    """
+    Function to get the top 200 relevant urls for the queries.
+    :param inverted_index: Inverted index already in memory. If None, it is read from disk.
+    """
+
+    # Get the 200 most similar urls in the relevance order.
+    retrieved_urls_in_relevance_order = get_cosine_similarity(inverted_index, 200)
+
+    # Dictionary to store query numbers and their top 200 matching urls
+    top_urls_math_map = dict()
 
-            # URLS here are in the string form as '(1,https://cs.uic.edu/faculty-staff/)'
-            # So, to get only the url, get the substring between comma and the closing bracket.
-            # Hence, some crappy string formatting.
-            comma_index = url.index(",")
-            closing_bracket_index = url.index(")")
+    for query_number, retrieved_urls_similarity_scores in retrieved_urls_in_relevance_order.items():
 
-            top_urls.append(url[comma_index + 1 : closing_bracket_index])
+        top_urls_math_map[query_number] = [url for url, cosine_similarity in retrieved_urls_similarity_scores]
 
-        top_urls_math_map[query_number] = top_urls
-        
     return top_urls_math_map
 
 
-def get_cosine_similarity():
+def get_cosine_similarity(inverted_index=None, k=None):
     """
     Driver function to get the cosine similarity between documents and queries.
+    :param inverted_index: Inverted index already in memory. If None, it is read from disk.
+    :param k: Number of most similar urls to keep for each query. If None, every matching url is kept.
     return cosine_similarity: Cosine Similarity between documents and queries.
     """
 
     # Get the TF-IDF of the queries.
     queries_tf_idf = queries_cleaning()
 
-    # Open the documents saved TF-IDF map.
-    with open(os.path.join(TF_IDF_FILES_DIR, "tf_idf.json"), "r") as doc_tf_idf_file:
+    # Open the saved inverted index of the documents, unless a searcher already holds it.
+    if inverted_index is None:
 
-        documents_tf_idf = dict(json.load(doc_tf_idf_file))
+        inverted_index = load_inverted_index()
 
     # Get the cosine similarity between documents and queries.
-    similarity = cosineSimilarityCalculator(documents_tf_idf, queries_tf_idf)
+    similarity = cosineSimilarityCalculator(inverted_index, queries_tf_idf, k)
 
     return similarity
@@ -4,13 +4,25 @@
 @date: 05/06/2019
 """
 
+import time
 import requests
+import threading
 from uuid import uuid4
 from bs4 import BeautifulSoup
+from collections import deque
 from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+from requests.adapters import HTTPAdapter
+from concurrent.futures import wait, FIRST_COMPLETED, ThreadPoolExecutor
 
 DOMAIN = "uic.edu"
 
+# Seconds to wait for a page before it is considered broken, in the concurrent crawl.
+REQUEST_TIMEOUT = 30
+
+# One requests session per crawler thread, so connections to every host are reused.
+thread_sessions = threading.local()
+
 
 def check_goodness(url):
     """
@@ -79,179 +91,555 @@ def check_domain(url, main_domain):
         return False
 
 
-def crawl_for_sites(main_url, number_of_pages_to_crawl, main_domain):
+def canonicalize_url(url):
+    """
+    Function to bring the different spellings of a url to one form, so a site is only crawled once.
+    The scheme and host are lowercased, "www." and default ports are removed from the host,
+    an empty path becomes "/" and the fragment is dropped.
+    :param url: URL to canonicalize.
+    :return canonical_url: Canonical form of the url.
+    """
+
+    url_parts = urlsplit(url.strip())
+    scheme = url_parts.scheme.lower()
+    host = url_parts.netloc.lower()
+
+    if host.startswith("www."):
+
+        host = host[len("www."):]
+
+    if (scheme == "http" and host.endswith(":80")) or (scheme == "https" and host.endswith(":443")):
+
+        host = host.rsplit(":", 1)[0]
+
+    return urlunsplit((scheme, host, url_parts.path or "/", url_parts.query, ""))
+
+
+class CrawlFrontier(object):
+    """
+    Queue of the sites to crawl in BFS order, with the set of every site ever added.
+    Sites are canonicalized when added, so checking for duplicates and popping the next site are both O(1).
+    """
+
+    def __init__(self):
+        """
+        Function to start an empty frontier.
+        """
+
+        self.queue = deque()
+        self.seen_urls = set()
+
+    def add(self, url):
+        """
+        Function to add a site at the back of the queue, unless it was already added.
+        :param url: URL of the site.
+        :return canonical_url: Canonical url of the site if it is new, else None.
+        """
+
+        canonical_url = canonicalize_url(url)
+        if canonical_url in self.seen_urls:
+
+            return None
+
+        self.seen_urls.add(canonical_url)
+        self.queue.append(canonical_url)
+
+        return canonical_url
+
+    def pop(self):
+        """
+        Function to take the site at the front of the queue, the oldest one added.
+        :return url: Canonical url of the site.
+        """
+
+        return self.queue.popleft()
+
+    def __len__(self):
+        """
+        Function to get the number of sites waiting in the queue.
+        :return length: Number of queued sites.
+        """
+
+        return len(self.queue)
+
+
+def get_outgoing_links(url, html, main_domain):
+    """
+    Function to get the outgoing links of a page inside the domain.
+    :param url: URL of the page.
+    :param html: HTML of the page.
+    :param main_domain: The domain to stick with while crawling.
+    :return local_urls: Outgoing urls in the domain, or None if the page has no anchors at all.
+    :return unknown_urls: Anchors which could not be resolved to a url.
+    """
+
+    local_urls = list()
+    unknown_urls = list()
+
+    # Extract base url to resolve relative links.
+    # Source: https://medium.freecodecamp.org/how-to-build-a-url-crawler-to-map-a-website-using-python-6a287be1da11.
+    url_parts = urlsplit(url)
+    url_base = url_parts.scheme + "://" + url_parts.netloc
+
+    # Get the soup of the site.
+    site_soup = BeautifulSoup(html, "lxml")
+
+    # Get all link in the url.
+    all_outgoing_links = site_soup.find_all('a')
+
+    # If dead end (no outgoing links), there is nothing to follow.
+    if not all_outgoing_links:
+
+        return None, unknown_urls
+
+    for link in all_outgoing_links:
+
+        anchor = link.attrs["href"] if "href" in link.attrs else ''
+
+        # Get the fragment and append to the base.
+        if anchor.startswith('/') or anchor.startswith("#"):
+
+            local_link = url_base + anchor
+            if check_domain(local_link, main_domain):
+
+                local_urls.append(local_link)
+
+        # If the base is already there, append it.
+        elif url_base in anchor:
+
+            # Check the domain so no foreign urls are considered.
+            if check_domain(anchor, main_domain):
+
+                local_urls.append(anchor)
+
+        # If the anchor starts with "http", add it to local urls.
+        elif anchor.startswith("http"):
+
+            # Check the domain so no foreign urls are considered.
+            if check_domain(anchor, main_domain):
+
+                local_urls.append(anchor)
+
+        # If all above conditions fail, it might be an unknown URL.
+        else:
+
+            unknown_urls.append(anchor)
+
+    # Canonical urls, so the link map matches the urls of the crawled sites.
+    local_urls = [canonicalize_url(local_url) for local_url in local_urls]
+
+    return local_urls, unknown_urls
+
+
+def request_page(url):
+    """
+    Function to hit a site with a random user agent.
+    :param url: URL to fetch.
+    :return html: HTML of the page, or None if the site is broken or unresponsive.
+    """
+
+    try:
+
+        # Generating a random user agent as client
+        # So, even though many requests are sent, it is not considered as spamming.
+        # Basically, IP Spoofing.
+        url_response = requests.get(
+            url,
+            headers = {'User-agent': 'Some-Anonymous-User-{}'.format(uuid4())}
+        )
+
+        # Continue if the site is unresponsive.
+        if url_response.status_code != 200:
+
+            print("\nThe URL ({url}) is unresponsive. Moving on with next site.\n".format(url=url))
+            return None
+
+    # Continue if the site url is broken.
+    except Exception as e:
+
+        print("\nThe URL ({url}) is broken. Moving on with next site.".format(url=url))
+        print("Error: {error_description}".format(error_description=e))
+        return None
+
+    return url_response.text
+
+
+def crawl_for_sites(main_url, number_of_pages_to_crawl, main_domain, page_handler=None, checkpoint=None):
     """
     Funtion to initialize the queue to store all the websites.
     :param main_url: Initial point to start crawling.
     :param number_of_pages_to_crawl: Minimum number of pages to crawl.
     :param main_domain: The domain to stick with while crawling.
+    :param page_handler: Function called with the url, HTML and outgoing links of every crawled site, once per site.
+    Sites found but not fetched when the crawl stops are fetched afterwards for it, without following their links.
+    :param checkpoint: CrawlCheckpoint to record the crawl in. If it holds an unfinished crawl, the crawl resumes from it.
     :return sites: List of websites.
     """
 
     # List to store crawled sites and Queue for BFS.
     sites_list = list()
-    helper_queue = list()
+    helper_queue = CrawlFrontier()
     unknown_urls = list()
     broken_urls = list()
 
-    # Map to store the document and words in the document.
-    documents_words_count_map = dict()
-
     # Mao to store the outgoing urls from the parent url.
     parent_children_url_map = dict()
 
-    # Check if main url is responding with a 200 OK.
-    try:
+    # Minor preprocessing.
+    # Canonicalize the main url, which also removes "www."
+    main_url = canonicalize_url(main_url)
 
-    	# Minor preprocessing.
-        # Remove "www." from the main url
-        main_url = main_url.replace("www.", "")
+    # Pages fetched before the crawl loop.
+    fetched_pages = dict()
 
-        # Generating a random user agent as client
-        # So, even though many requests are sent, it is not considered as spamming.
-        # Basically, IP Spoofing.
-        main_url_response = requests.get(
-            main_url,
-            headers = {'User-agent': 'Some-Anonymous-User-{}'.format(str(uuid4()))}
-        )
+    # Pick the crawl up where it stopped.
+    if checkpoint is not None and checkpoint.resumed:
+
+        sites_list, helper_queue, unknown_urls, broken_urls, parent_children_url_map = checkpoint.load()
+        print("Resuming the crawl with {} sites found and {} sites left to crawl.".format(len(sites_list), len(helper_queue)))
 
-        # If the main url can not be crawled, raise exception.
-        if main_url_response.status_code != 200:
+    else:
 
-            raise Exception('\nThe main URL ({url}) can not be reached.\n'.format(url=main_url))
-            broken_urls.append(main_url)
+        # Check if main url is responding with a 200 OK.
+        # The main url could be broken.
+        main_url_html = request_page(main_url)
+        if main_url_html is None:
 
-    # The main url could be broken.
-    except:
+            raise Exception('\nThe main URL ({url}) provided is broken.\n'.format(url=main_url))
 
-        raise Exception('\nThe main URL ({url}) provided is broken.\n'.format(url=main_url))
-        broken_urls.append(main_url)
+        # Add the main url to our queue and sites list.
+        sites_list.append(helper_queue.add(main_url))
+        if checkpoint is not None:
 
-    # Add the main url to our queue and sites list.
-    sites_list.append(main_url)
-    helper_queue.append(main_url)
+            checkpoint.add_site(main_url)
 
-    # Index of number of crawled websites.
-    crawled_sites_number = 0
+        # The main url is crawled first, with the response of the check above.
+        fetched_pages[main_url] = main_url_html
 
-    # Operation to crawl only 3000 sites
-    while crawled_sites_number < number_of_pages_to_crawl or not helper_queue:
+    # Index of number of crawled websites, the main url is not counted.
+    crawled_sites_number = len(sites_list) - 1
 
-        # Store the local outgoing urls.
-        local_urls = list()
+    # Operation to crawl only 3000 sites
+    while crawled_sites_number < number_of_pages_to_crawl and helper_queue:
 
-        # Pop the url to crawl.
+        # Pop the url to crawl, from the front of the queue to obey BFS traversal.
         url = helper_queue.pop()
 
-        # Minor preprocessing.
-        # Remove "www." from the main url
-        url = url.replace("www.", "")
+        # Hit the site.
+        html = fetched_pages.pop(url) if url in fetched_pages else request_page(url)
+        if html is None:
 
-        # Extract base url to resolve relative links.
-        # Source: https://medium.freecodecamp.org/how-to-build-a-url-crawler-to-map-a-website-using-python-6a287be1da11.
-        url_parts = urlsplit(url)
-        url_base = (url_parts.netloc).replace("www.", "")
-        url_base = url_parts.scheme + "://" + url_parts.netloc
+            broken_urls.append(url)
+            if checkpoint is not None:
 
-        # If URL = "https://somewebsite.com/something",
-        # then path should only be "https://somewebsite.com/"
-        if '/' in url:
-            url_path = url[:url.rfind('/') + 1]
-        else:
-            url_path = url
+                checkpoint.add_broken_site(url)
 
-        # Hit the site.
-        try:
-
-            # Generating a random user agent as client
-            # So, even though many requests are sent, it is not considered as spamming.
-            # Basically, IP Spoofing.
-            url_response = requests.get(
-                url,
-                headers = {'User-agent': 'Some-Anonymous-User-{}'.format(uuid4())}
-            )
-
-            # Continue if the site is unresponsive.
-            if url_response.status_code != 200:
-
-                print("\nThe URL ({url}) is unresponsive. Moving on with next site.\n".format(url=url))
-                broken_urls.append(url)
-                continue
-
-        # Continue if the site url is broken.
-        except Exception as e:
-            
-            print("\nThe URL ({url}) is broken. Moving on with next site.".format(url=url))
-            print("Error: {error_description}".format(error_description=e))
-            broken_urls.append(url)
             continue
 
-        # Get the soup of the site.
-        site_soup = BeautifulSoup(url_response.text, "lxml")
+        # Get all the outgoing links in the url.
+        local_urls, unknown_anchors = get_outgoing_links(url, html, main_domain)
+        unknown_urls += unknown_anchors
+
+        # Hand the fetched page over, so it does not need to be downloaded again.
+        if page_handler is not None:
+
+            page_handler(url, html, local_urls or [])
+
+        # If dead end (no outgoing links), there is nothing to follow.
+        if local_urls is not None:
+
+            # Push the url and all the outgoing urls to the document 
+            parent_children_url_map[url] = local_urls
+
+            for l in local_urls:
+
+                # Check if the URL follows the "GOODNESS" rules mentioned above.
+                if check_goodness(l) is False:
 
-        # Get all link in the url.
-        all_outgoing_links = site_soup.find_all('a')
+                    continue
 
-        # If dead end (no outgoing links), continue.
-        if not all_outgoing_links:
+                # Add the new outgoing urls to the back of the queue. Duplicates are not added again.
+                if crawled_sites_number < number_of_pages_to_crawl and helper_queue.add(l) is not None:
+
+                    print("Crawled Page Information -> Number {number} and URL {site}".format(
+                        number=crawled_sites_number,
+                        site=l)
+                    )
+                    crawled_sites_number += 1
+                    sites_list.append(l)
+                    if checkpoint is not None:
+
+                        checkpoint.add_site(l)
+
+        # The site is recorded as crawled only after its outgoing urls, so a checkpoint never loses them.
+        if checkpoint is not None:
+
+            checkpoint.add_crawled_site(url, local_urls, unknown_anchors)
+
+    # Sites found but not crawled yet are fetched once for the page handler, without adding new sites.
+    while page_handler is not None and helper_queue:
+
+        url = helper_queue.pop()
+        html = request_page(url)
+        if html is None:
+
+            broken_urls.append(url)
+            if checkpoint is not None:
+
+                checkpoint.add_broken_site(url)
 
             continue
 
-        # Fill the queue with the outgoing links now.
-        for link in all_outgoing_links:
+        local_urls, unknown_anchors = get_outgoing_links(url, html, main_domain)
+        unknown_urls += unknown_anchors
+        if local_urls is not None:
+
+            parent_children_url_map[url] = local_urls
+
+        page_handler(url, html, local_urls or [])
+        if checkpoint is not None:
+
+            checkpoint.add_crawled_site(url, local_urls, unknown_anchors)
+
+    return sites_list, unknown_urls, broken_urls, parent_children_url_map
+
+
+class HostPoliteness(object):
+    """
+    Limits on the requests sent to every host by the concurrent crawl.
+    At most max_requests_per_host requests are in flight per host, and they start at least politeness_delay seconds apart.
+    """
+
+    def __init__(self, max_requests_per_host, politeness_delay):
+        """
+        Function to initialize the limits.
+        :param max_requests_per_host: Most requests in flight to a single host.
+        :param politeness_delay: Seconds between the starts of two requests to a single host.
+        """
+
+        self.max_requests_per_host = max_requests_per_host
+        self.politeness_delay = politeness_delay
+        self.lock = threading.Lock()
+        self.host_semaphores = dict()
+        self.host_next_request_times = dict()
+
+    def acquire(self, host):
+        """
+        Function to wait until a request to the host is allowed.
+        :param host: Host of the url.
+        """
+
+        with self.lock:
+
+            if host not in self.host_semaphores:
+
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.max_requests_per_host)
+                self.host_next_request_times[host] = 0
+
+            host_semaphore = self.host_semaphores[host]
+
+        host_semaphore.acquire()
+
+        # Reserve the next start time of this host, then wait for it.
+        with self.lock:
+
+            request_time = max(time.time(), self.host_next_request_times[host])
+            self.host_next_request_times[host] = request_time + self.politeness_delay
+
+        time.sleep(max(0, request_time - time.time()))
+
+    def release(self, host):
+        """
+        Function to free the request slot of the host.
+        :param host: Host of the url.
+        """
+
+        self.host_semaphores[host].release()
+
+
+def get_thread_session(max_requests_per_host):
+    """
+    Function to get the requests session of the current thread, creating it on first use.
+    :param max_requests_per_host: Most requests in flight to a single host, to size the connection pools.
+    :return session: Requests session of this thread.
+    """
+
+    if not hasattr(thread_sessions, "session"):
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=100, pool_maxsize=max_requests_per_host)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        thread_sessions.session = session
+
+    return thread_sessions.session
+
+
+def fetch_page(url, host_politeness):
+    """
+    Function to fetch a page within the politeness limits of its host.
+    :param url: URL to fetch.
+    :param host_politeness: Limits on the requests to every host.
+    :return html: HTML of the page, or None if the page is broken or unresponsive.
+    :return error: Why the page could not be fetched, or None.
+    """
+
+    host = urlsplit(url).netloc
+    host_politeness.acquire(host)
+
+    try:
+
+        # Generating a random user agent as client, as in crawl_for_sites.
+        url_response = get_thread_session(host_politeness.max_requests_per_host).get(
+            url,
+            headers = {'User-agent': 'Some-Anonymous-User-{}'.format(uuid4())},
+            timeout = REQUEST_TIMEOUT
+        )
+
+        if url_response.status_code != 200:
+
+            return None, "Status code {}".format(url_response.status_code)
+
+        return url_response.text, None
+
+    except Exception as e:
+
+        return None, e
+
+    finally:
+
+        host_politeness.release(host)
+
+
+def crawl_for_sites_concurrently(main_url, number_of_pages_to_crawl, main_domain, max_workers=8, max_requests_per_host=2, politeness_delay=0.0, page_handler=None, checkpoint=None):
+    """
+    Funtion to crawl for websites with several fetches in flight.
+    Pages are fetched by a pool of threads, each reusing its connections through a requests session,
+    while the links are followed in the main thread in the order the pages arrive.
+    :param main_url: Initial point to start crawling.
+    :param number_of_pages_to_crawl: Minimum number of pages to crawl.
+    :param main_domain: The domain to stick with while crawling.
+    :param max_workers: Most fetches in flight.
+    :param max_requests_per_host: Most fetches in flight to a single host.
+    :param politeness_delay: Seconds between the starts of two fetches to a single host.
+    :param page_handler: Function called in the main thread with the url, HTML and outgoing links of every crawled site.
+    Sites found but not fetched when the crawl stops are fetched afterwards for it, without following their links.
+    :param checkpoint: CrawlCheckpoint to record the crawl in. If it holds an unfinished crawl, the crawl resumes from it.
+    :return sites: List of websites, unknown urls, broken urls and outgoing urls of every crawled url.
+    """
+
+    # List to store crawled sites and Queue for BFS.
+    sites_list = list()
+    helper_queue = CrawlFrontier()
+    unknown_urls = list()
+    broken_urls = list()
+
+    # Mao to store the outgoing urls from the parent url.
+    parent_children_url_map = dict()
+
+    # Minor preprocessing.
+    # Canonicalize the main url, which also removes "www."
+    main_url = canonicalize_url(main_url)
+
+    # Pick the crawl up where it stopped.
+    if checkpoint is not None and checkpoint.resumed:
+
+        sites_list, helper_queue, unknown_urls, broken_urls, parent_children_url_map = checkpoint.load()
+        print("Resuming the crawl with {} sites found and {} sites left to crawl.".format(len(sites_list), len(helper_queue)))
+
+    else:
+
+        # Add the main url to our queue and sites list.
+        sites_list.append(helper_queue.add(main_url))
+        if checkpoint is not None:
+
+            checkpoint.add_site(main_url)
+
+    host_politeness = HostPoliteness(max_requests_per_host, politeness_delay)
+
+    # Index of number of crawled websites, the main url is not counted.
+    crawled_sites_number = len(sites_list) - 1
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = dict()
+
+    try:
+
+        # With a page handler, the queued sites are still fetched once no more sites are needed.
+        while (crawled_sites_number < number_of_pages_to_crawl or page_handler is not None) and (helper_queue or in_flight):
+
+            # Keep the pool busy with urls from the front of the queue.
+            while helper_queue and len(in_flight) < max_workers:
+
+                url = helper_queue.pop()
+                in_flight[executor.submit(fetch_page, url, host_politeness)] = url
+
+            done, not_done = wait(list(in_flight.keys()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                url = in_flight.pop(future)
+                html, error = future.result()
+
+                if html is None:
+
+                    # If the main url can not be crawled, raise exception.
+                    if url == main_url:
+
+                        raise Exception('\nThe main URL ({url}) provided is broken.\n'.format(url=main_url))
 
-            anchor = link.attrs["href"] if "href" in link.attrs else ''
+                    print("\nThe URL ({url}) is broken. Moving on with next site.".format(url=url))
+                    print("Error: {error_description}".format(error_description=error))
+                    broken_urls.append(url)
+                    if checkpoint is not None:
 
-            # Get the fragment and append to the base.
-            if anchor.startswith('/') or anchor.startswith("#"):
+                        checkpoint.add_broken_site(url)
 
-                local_link = url_base + anchor
-                if check_domain(local_link, main_domain):
+                    continue
 
-                    local_urls.append(local_link)
+                # Get all the outgoing links in the url.
+                local_urls, unknown_anchors = get_outgoing_links(url, html, main_domain)
+                unknown_urls += unknown_anchors
 
-            # If the base is already there, append it.
-            elif url_base in anchor:
+                # Hand the fetched page over, so it does not need to be downloaded again.
+                if page_handler is not None:
 
-                # Check the domain so no foreign urls are considered.
-                if check_domain(anchor, main_domain):
+                    page_handler(url, html, local_urls or [])
 
-                    local_urls.append(anchor)
+                # If dead end (no outgoing links), there is nothing to follow.
+                if local_urls is not None:
 
-            # If the anchor starts with "http", add it to local urls.
-            elif anchor.startswith("http"):
+                    # Push the url and all the outgoing urls to the document
+                    parent_children_url_map[url] = local_urls
 
-            	# Check the domain so no foreign urls are considered.
-                if check_domain(anchor, main_domain):
+                    for l in local_urls:
 
-                    local_urls.append(anchor)
+                        # Check if the URL follows the "GOODNESS" rules mentioned above.
+                        if check_goodness(l) is False:
 
-            # If all above conditions fail, it might be an unknown URL.
-            else:
+                            continue
 
-            	unknown_urls.append(anchor)
+                        # Add the new outgoing urls to the back of the queue. Duplicates are not added again.
+                        if crawled_sites_number < number_of_pages_to_crawl and helper_queue.add(l) is not None:
 
-        # Push the url and all the outgoing urls to the document 
-        parent_children_url_map[url] = local_urls
+                            print("Crawled Page Information -> Number {number} and URL {site}".format(
+                                number=crawled_sites_number,
+                                site=l)
+                            )
+                            crawled_sites_number += 1
+                            sites_list.append(l)
+                            if checkpoint is not None:
 
-        # Add the outgoing urls to the queue from left.
-        # Adding from left obeys BFS traversal.
-        helper_queue = local_urls + helper_queue
-        for l in local_urls:
+                                checkpoint.add_site(l)
 
-        	# Check if the URL follows the "GOODNESS" rules mentioned above.
-            if check_goodness(l) is False:
+                # The site is recorded as crawled only after its outgoing urls, so a checkpoint never loses them.
+                if checkpoint is not None:
 
-                continue
+                    checkpoint.add_crawled_site(url, local_urls, unknown_anchors)
 
-            # To avoid duplicated, check if it is already present in the queue.
-            if l not in sites_list:
+    finally:
 
-                print("Crawled Page Information -> Number {number} and URL {site}".format(
-                	number=crawled_sites_number, 
-                	site=l)
-                )
-                crawled_sites_number += 1
-                sites_list.append(l)
+        # Fetches still in flight are not needed anymore.
+        executor.shutdown(wait=True, cancel_futures=True)
 
     return sites_list, unknown_urls, broken_urls, parent_children_url_map
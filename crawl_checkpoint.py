@@ -0,0 +1,176 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import json
+import sqlite3
+
+from crawl_all_sites import CrawlFrontier
+
+CHECKPOINT_FILE = "./crawl_checkpoint.db"
+
+# Number of crawled pages between two commits of the checkpoint.
+CHECKPOINT_INTERVAL = 100
+
+#############################################################################################
+# CHECKPOINT TABLES (rows are only ever inserted, except the crawl information)             #
+#                                                                                           #
+# crawl_information : name, value     (main url, domain, documents written, finished flag)  #
+# sites             : number, url     (every site added to the frontier, in BFS order)      #
+# crawled_sites     : url, broken     (sites already fetched, the others are the frontier)  #
+# outgoing_links    : url, links      (json list of the outgoing urls of a crawled site)    #
+# unknown_anchors   : anchor          (anchors which could not be resolved to a url)        #
+#############################################################################################
+
+
+class CrawlCheckpoint(object):
+    """
+    On-disk state of a crawl, so a crawl which stopped halfway can resume where it stopped.
+    Changes are written to a SQLite database as the crawl goes and committed every CHECKPOINT_INTERVAL pages,
+    so a crash only loses the pages crawled since the last commit.
+    """
+
+    def __init__(self, main_url, main_domain, checkpoint_file=CHECKPOINT_FILE):
+        """
+        Function to open the checkpoint of the crawl.
+        A checkpoint of another crawl, or of a finished crawl, is cleared to start over.
+        :param main_url: Initial point of the crawl.
+        :param main_domain: The domain of the crawl.
+        :param checkpoint_file: Path of the SQLite database.
+        """
+
+        self.main_url = main_url
+        self.main_domain = main_domain
+        self.pages_since_commit = 0
+
+        # Function called before every commit, to finish the work the committed pages depend on.
+        self.before_save = None
+
+        self.connection = sqlite3.connect(checkpoint_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS crawl_information (name TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sites (number INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS crawled_sites (url TEXT PRIMARY KEY, broken INTEGER)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS outgoing_links (url TEXT PRIMARY KEY, links TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS unknown_anchors (anchor TEXT)")
+
+        crawl_information = dict(self.connection.execute("SELECT name, value FROM crawl_information").fetchall())
+        number_of_sites = self.connection.execute("SELECT COUNT(*) FROM sites").fetchone()[0]
+
+        # Only an unfinished crawl with the same initial url and domain, which got to its first commit, is resumed.
+        self.resumed = (
+            crawl_information.get("main_url") == main_url and
+            crawl_information.get("main_domain") == main_domain and
+            crawl_information.get("finished") == "0" and
+            number_of_sites > 0
+        )
+
+        if self.resumed is False:
+
+            for table in ["crawl_information", "sites", "crawled_sites", "outgoing_links", "unknown_anchors"]:
+
+                self.connection.execute("DELETE FROM {}".format(table))
+
+            crawl_information = {"main_url": main_url, "main_domain": main_domain, "finished": "0", "documents_written": "0"}
+            self.connection.executemany("INSERT INTO crawl_information VALUES (?, ?)", crawl_information.items())
+            self.connection.commit()
+
+        # Number of documents written from the crawled pages, for the page handler to keep numbering them.
+        self.documents_written = int(crawl_information["documents_written"])
+
+    def load(self):
+        """
+        Function to rebuild the state of the crawl from the checkpoint.
+        :return sites_list: Sites added to the frontier, in BFS order.
+        :return frontier: Frontier with every site seen, and the sites not crawled yet queued.
+        :return unknown_urls: Anchors which could not be resolved to a url.
+        :return broken_urls: Sites which could not be fetched.
+        :return parent_children_url_map: Outgoing urls of every crawled site.
+        """
+
+        sites_list = [url for url, in self.connection.execute("SELECT url FROM sites ORDER BY number")]
+        crawled_sites = dict(self.connection.execute("SELECT url, broken FROM crawled_sites").fetchall())
+
+        frontier = CrawlFrontier()
+        frontier.seen_urls.update(sites_list)
+        frontier.queue.extend(url for url in sites_list if url not in crawled_sites)
+
+        unknown_urls = [anchor for anchor, in self.connection.execute("SELECT anchor FROM unknown_anchors ORDER BY rowid")]
+        broken_urls = [url for url in sites_list if crawled_sites.get(url) == 1]
+
+        parent_children_url_map = dict()
+        for url, links in self.connection.execute("SELECT url, links FROM outgoing_links"):
+
+            parent_children_url_map[url] = json.loads(links)
+
+        return sites_list, frontier, unknown_urls, broken_urls, parent_children_url_map
+
+    def add_site(self, url):
+        """
+        Function to record a site added to the frontier.
+        :param url: Canonical url of the site.
+        """
+
+        self.connection.execute("INSERT OR IGNORE INTO sites (url) VALUES (?)", (url,))
+
+    def add_crawled_site(self, url, local_urls, unknown_anchors):
+        """
+        Function to record a crawled site and its outgoing links.
+        :param url: Canonical url of the site.
+        :param local_urls: Outgoing urls of the site, or None if it has no anchors.
+        :param unknown_anchors: Anchors of the site which could not be resolved to a url.
+        """
+
+        self.connection.execute("INSERT OR REPLACE INTO crawled_sites VALUES (?, 0)", (url,))
+        if local_urls is not None:
+
+            self.connection.execute("INSERT OR REPLACE INTO outgoing_links VALUES (?, ?)", (url, json.dumps(local_urls)))
+
+        self.connection.executemany("INSERT INTO unknown_anchors VALUES (?)", [(anchor,) for anchor in unknown_anchors])
+        self.page_crawled()
+
+    def add_broken_site(self, url):
+        """
+        Function to record a site which could not be fetched.
+        :param url: Canonical url of the site.
+        """
+
+        self.connection.execute("INSERT OR REPLACE INTO crawled_sites VALUES (?, 1)", (url,))
+        self.page_crawled()
+
+    def page_crawled(self):
+        """
+        Function to commit the checkpoint once every CHECKPOINT_INTERVAL pages.
+        """
+
+        self.pages_since_commit += 1
+        if self.pages_since_commit >= CHECKPOINT_INTERVAL:
+
+            self.save()
+
+    def save(self):
+        """
+        Function to commit every change since the last commit, with the number of documents written.
+        """
+
+        if self.before_save is not None:
+
+            self.before_save()
+
+        self.connection.execute(
+            "UPDATE crawl_information SET value = ? WHERE name = 'documents_written'",
+            (str(self.documents_written),)
+        )
+        self.connection.commit()
+        self.pages_since_commit = 0
+
+    def finish(self):
+        """
+        Function to mark the crawl as finished, so the next crawl starts over.
+        """
+
+        self.connection.execute("UPDATE crawl_information SET value = '1' WHERE name = 'finished'")
+        self.save()
+        self.connection.close()
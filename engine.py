@@ -4,12 +4,21 @@
 @date: 05/06/2019
 """
 
+import os
 import time
 import argparse
 
 from crawl_all_sites import crawl_for_sites
-from generate_data import create_documents
+from crawl_all_sites import crawl_for_sites_concurrently
+from crawl_checkpoint import CHECKPOINT_FILE
+from crawl_checkpoint import CrawlCheckpoint
+from generate_data import DocumentWriter
 from generate_data import create_data_directory
+from generate_data import create_document_processes
+from generate_data import remove_documents_after
+from recrawl import REPORT_FILE
+from recrawl import recrawl_for_sites
+from recrawl import remove_registry
 from clean_documents import remove_extra_lines_and_tabs
 
 # Parse Arguments
@@ -29,6 +38,41 @@ parser.add_argument(
     type=str,
     help="The domain in which crawling should happen. For example: 'uic.edu'"
 )
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of pages fetched at the same time. With 1, the pages are crawled one by one."
+)
+parser.add_argument(
+    "--max_requests_per_host",
+    type=int,
+    default=2,
+    help="Number of pages fetched at the same time from a single host, when crawling with several workers."
+)
+parser.add_argument(
+    "--politeness_delay",
+    type=float,
+    default=0.0,
+    help="Seconds between two requests to a single host, when crawling with several workers."
+)
+parser.add_argument(
+    "--processes",
+    type=int,
+    default=os.cpu_count(),
+    help="Number of worker processes extracting and preprocessing the text of the crawled pages. With 1, it is done in the crawler's process."
+)
+parser.add_argument(
+    "--checkpoint_file",
+    type=str,
+    default=CHECKPOINT_FILE,
+    help="SQLite file where the crawl is checkpointed. An unfinished crawl with the same initial URL and domain resumes from it."
+)
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="Crawl again with conditional requests, rewriting only the documents of the pages which changed."
+)
 args = parser.parse_args()
 
 
@@ -52,8 +96,75 @@ def crawler_driving_function():
 	min_pages_to_crawl = args.number_of_pages
 	domain = args.domain
 
+	# The documents are written while crawling, from the pages the crawler already fetched.
+	if create_data_directory() is False:
+
+		raise Exception("DirectoryError: You do not have write privilege in the directory.")
+
+	# The crawl is checkpointed as it goes, and an unfinished crawl of the same site is resumed.
+	checkpoint = CrawlCheckpoint(main_url, domain, args.checkpoint_file)
+
+	if checkpoint.resumed is False:
+
+		# A new crawl numbers the documents from 1 again, so the document numbers of the incremental crawls are stale.
+		remove_registry()
+
+	# Documents written after the last checkpoint are written again when their pages are crawled again.
+	# A new crawl removes every document of the crawls before it.
+	remove_documents_after(checkpoint.documents_written)
+
+	# The text of the pages is preprocessed by worker processes, while the crawl goes on.
+	pool = create_document_processes(args.processes) if args.processes > 1 else None
+	document_writer = DocumentWriter(checkpoint.documents_written + 1, pool)
+
+	def write_page(page_url, html, outgoing_links):
+		"""
+		Function to write the document of a crawled page and count it in the checkpoint.
+		:param page_url: URL of the page.
+		:param html: HTML of the page.
+		:param outgoing_links: List of the outgoing urls of the page.
+		"""
+
+		document_writer.write_page(page_url, html, outgoing_links)
+		checkpoint.documents_written = document_writer.document_name_index - 1
+
+	def write_pending_pages():
+		"""
+		Function to write the documents still preprocessed by the workers, before the checkpoint records their pages as crawled.
+		"""
+
+		document_writer.flush()
+		checkpoint.documents_written = document_writer.document_name_index - 1
+
+	checkpoint.before_save = write_pending_pages
+
+	print("################################################################################################\n\n")
+
 	# Get the crawled sites and unknown sites.
-	sites_list, unknown_urls, broken_urls, parent_children_url_map = crawl_for_sites(main_url, min_pages_to_crawl, domain)
+	if args.workers > 1:
+
+		sites_list, unknown_urls, broken_urls, parent_children_url_map = crawl_for_sites_concurrently(
+			main_url,
+			min_pages_to_crawl,
+			domain,
+			max_workers=args.workers,
+			max_requests_per_host=args.max_requests_per_host,
+			politeness_delay=args.politeness_delay,
+			page_handler=write_page,
+			checkpoint=checkpoint
+		)
+
+	else:
+
+		sites_list, unknown_urls, broken_urls, parent_children_url_map = crawl_for_sites(main_url, min_pages_to_crawl, domain, write_page, checkpoint)
+
+	# The next crawl starts over.
+	checkpoint.finish()
+
+	if pool is not None:
+
+		pool.close()
+		pool.join()
 
 	# Record crawl end time.
 	crawl_end_time = time.time()
@@ -75,20 +186,7 @@ def crawler_driving_function():
 
 	print("################################################################################################")
 
-	print("Now, extracting the text data from the crawled websites.")
-
-	print("################################################################################################")
-
-	if create_data_directory():
-
-		print("################################################################################################\n\n")
-
-		creation_flag = create_documents(sites_list, parent_children_url_map)
-		print("\n\nText extracted from the crawled pages.")
-
-	else:
-
-		raise Exception("DirectoryError: You do not have write privilege in the directory.")
+	print("Text extracted from {} crawled pages.".format(document_writer.document_name_index - 1))
 
 	print("################################################################################################")
 
@@ -108,7 +206,48 @@ def crawler_driving_function():
 
 		print("################################################################################################")
 
+def incremental_crawler_driving_function():
+	"""
+	Driver Function to crawl the sites again and update the database with the pages which changed.
+	"""
+
+	# Time to record the start time of the crawling.
+	crawl_start_time = time.time()
+
+	print("################################################################################################")
+
+	print("Incremental Web Crawling startes now.\n\n")
+
+	if create_data_directory() is False:
+
+		raise Exception("DirectoryError: You do not have write privilege in the directory.")
+
+	report = recrawl_for_sites(args.initial_url, args.number_of_pages, args.domain)
+
+	print("\n\nIncremental Web Crawling finished now.\n")
+
+	print("################################################################################################")
+
+	print("Total time to crawl the web: {} Minutes".format((time.time() - crawl_start_time)/60))
+
+	print("################################################################################################")
+
+	print("Documents added: {}".format(len(report["ADDED"])))
+	print("Documents changed: {}".format(len(report["CHANGED"])))
+	print("Documents removed: {}".format(len(report["REMOVED"])))
+	print("Documents kept from the last crawl, unreachable now: {}".format(len(report["UNREACHABLE"])))
+	print("Documents unchanged: {}".format(report["UNCHANGED"]))
+	print("The documents are listed in {}.".format(REPORT_FILE))
+
+	print("################################################################################################")
+
 # Main funciton starts here..
 if __name__ == "__main__":
 
-	crawler_driving_function()
+	if args.incremental:
+
+		incremental_crawler_driving_function()
+
+	else:
+
+		crawler_driving_function()
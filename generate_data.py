@@ -7,12 +7,17 @@
 import os
 import json
 import collections
+import multiprocessing
 
-from clean_html import extract_text_from_page
-from clean_html import preprocess_text
+from clean_html import extract_text_from_html
+from clean_html import generate_text_terms
+from clean_html import initialize_text_processing
 
 DATA_DIRECTORY = "./documents"
 
+# Pages handed to the worker processes and not written yet, before the writer waits for the oldest one.
+MAX_PENDING_PAGES = 1000
+
 
 def create_data_directory():
 	"""
@@ -40,61 +45,164 @@ def create_data_directory():
 			return False
 
 
-def create_documents(sites_list, parent_children_url_map):
+def create_document_contents(document_name_index, page_url, raw_text_data, outgoing_links):
+	"""
+	Function to preprocess the text of a page into the contents of its document.
+	:param document_name_index: Number of the document, used as its name.
+	:param page_url: URL of the page.
+	:param raw_text_data: Text extracted from the page.
+	:param outgoing_links: List of the outgoing urls of the page.
+	:return document_contents_map: Contents of the document.
+	"""
+
+	# The terms are counted as they are generated.
+	preprocessed_text_words_count_map = dict(collections.Counter(generate_text_terms(raw_text_data)))
+
+	document_contents_map = dict()
+	document_contents_map["INDEX"] = document_name_index
+	document_contents_map["URL"] = page_url
+	document_contents_map["OUTGOING_LINKS"] = outgoing_links
+	document_contents_map["WORD_COUNT_MAP"] = preprocessed_text_words_count_map
+
+	return document_contents_map
+
+
+def save_document(document_contents_map):
+	"""
+	Function to write a document, named after its number.
+	:param document_contents_map: Contents of the document.
+	"""
+
+	# Create a json file which would store the web graph information of the url.
+	document_name = str(document_contents_map["INDEX"]) + ".json"
+	with open(os.path.join(DATA_DIRECTORY, document_name), 'w') as doc_file:
+
+		json.dump(document_contents_map, doc_file)
+
+
+def create_page_contents(page_url, html, outgoing_links):
+	"""
+	Function to extract and preprocess the text of a fetched page, run by the worker processes.
+	The document number is given when the document is written, so the documents keep the crawl order.
+	:param page_url: URL of the page.
+	:param html: HTML of the page.
+	:param outgoing_links: List of the outgoing urls of the page.
+	:return document_contents_map: Contents of the document, without its number.
+	"""
+
+	return create_document_contents(None, page_url, extract_text_from_html(html), outgoing_links)
+
+
+def create_document_processes(processes):
+	"""
+	Function to start the worker processes which preprocess the documents.
+	Every worker loads the stopwords, the stemmer and the tokenizer once, when it starts.
+	:param processes: Number of worker processes.
+	:return pool: Pool of worker processes.
+	"""
+
+	return multiprocessing.Pool(processes, initializer=initialize_text_processing)
+
+
+class DocumentWriter(object):
 	"""
-	Function to create documents in the directory.
-	:param sites_list: The list of sites crawled.
+	Writes the document of every page handed over by the crawler, from the HTML it already fetched.
+	With a pool of worker processes, the pages are preprocessed in parallel and their documents are written
+	in the order the pages were handed over, so the documents are numbered as in a run without workers.
 	"""
 
-	# Index to store the document name.
-	document_name_index = 1
+	def __init__(self, document_name_index=1, pool=None):
+		"""
+		Function to start numbering the documents.
+		:param document_name_index: Number of the first document to write, after the documents of a resumed crawl.
+		:param pool: Pool of worker processes preprocessing the pages, or None to preprocess them in this process.
+		"""
+
+		# Index to store the document name.
+		self.document_name_index = document_name_index
 
-	try:
+		self.pool = pool
 
-		# Traverse through the urls, preprocess them and create document.
-		for page_url in sites_list:
+		# Url and result of the pages being preprocessed by the workers, in the order they were handed over.
+		self.pending_pages = collections.deque()
+
+	def write_page(self, page_url, html, outgoing_links):
+		"""
+		Function to extract the text from a fetched page and create its document.
+		With worker processes, the document is written once it and the documents of all the pages before it are ready.
+		:param page_url: URL of the page.
+		:param html: HTML of the page.
+		:param outgoing_links: List of the outgoing urls of the page.
+		"""
+
+		if self.pool is None:
 
 			try:
 
-				print("Processing document {doc_number}.".format(doc_number=document_name_index))
-				raw_text_data = extract_text_from_page(page_url)
-				preprocessed_text = preprocess_text(raw_text_data)
-				preprocessed_text_words = preprocessed_text.split(" ")
-				preprocessed_text_words_count_map = dict(collections.Counter(preprocessed_text_words))
+				self.write_contents(create_page_contents(page_url, html, outgoing_links))
 
-				document_contents_map = dict()
-				document_contents_map["INDEX"] = document_name_index
-				document_contents_map["URL"] = page_url
+			except Exception as e:
 
-				# Some urls in the parent_children_url_map would not have children.
-				try: 
+				print("Could not extract text from {url} because of the error below.\n".format(url=page_url))
+				print(e)
 
-					document_contents_map["OUTGOING_LINKS"] = parent_children_url_map[page_url]
+			return
 
-				except:
+		self.pending_pages.append((page_url, self.pool.apply_async(create_page_contents, (page_url, html, outgoing_links))))
+		self.write_finished_pages()
 
-					# If no children, empty list as all outgoing urls list.
-					document_contents_map["OUTGOING_LINKS"] = []
+	def write_finished_pages(self, wait_for_all=False):
+		"""
+		Function to write the documents of the oldest pages whose preprocessing finished.
+		It waits for the oldest page when too many pages are pending, so the HTML handed over does not pile up in memory.
+		:param wait_for_all: Whether to wait for every pending page.
+		"""
 
-				document_contents_map["WORD_COUNT_MAP"] = preprocessed_text_words_count_map
+		while self.pending_pages and (
+			wait_for_all or
+			len(self.pending_pages) > MAX_PENDING_PAGES or
+			self.pending_pages[0][1].ready()
+		):
 
-				# Create a json file which would store the web graph information of the url.
-				document_name = str(document_name_index) + ".json"
-				with open(os.path.join(DATA_DIRECTORY, document_name), 'w') as doc_file:
+			page_url, result = self.pending_pages.popleft()
 
-					json.dump(document_contents_map, doc_file)
+			try:
 
-				document_name_index += 1
+				self.write_contents(result.get())
 
 			except Exception as e:
 
 				print("Could not extract text from {url} because of the error below.\n".format(url=page_url))
 				print(e)
-				continue
 
-		return True
+	def flush(self):
+		"""
+		Function to wait for every pending page and write its document.
+		"""
+
+		self.write_finished_pages(wait_for_all=True)
+
+	def write_contents(self, document_contents_map):
+		"""
+		Function to number a preprocessed document and write it.
+		:param document_contents_map: Contents of the document, without its number.
+		"""
+
+		print("Processing document {doc_number}.".format(doc_number=self.document_name_index))
+		document_contents_map["INDEX"] = self.document_name_index
+		save_document(document_contents_map)
+		self.document_name_index += 1
+
+
+def remove_documents_after(document_name_index):
+	"""
+	Function to remove the documents numbered after the given one, written after the last checkpoint of a crawl.
+	:param document_name_index: Number of the last document to keep.
+	"""
+
+	for document_name in os.listdir(DATA_DIRECTORY):
 
-	except Exception as e:
+		name, extension = os.path.splitext(document_name)
+		if extension == ".json" and name.isdigit() and int(name) > document_name_index:
 
-		print(e)
-		return False
+			os.remove(os.path.join(DATA_DIRECTORY, document_name))
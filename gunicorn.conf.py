@@ -0,0 +1,39 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+# Gunicorn settings of the search server.
+# Run it with: gunicorn -c gunicorn.conf.py search_engine_web_app:app
+
+import os
+
+bind = os.environ.get("SEARCH_BIND", "127.0.0.1:8000")
+
+# The app, with its searcher, is loaded once before the workers are forked,
+# so every worker shares the pages of the memory mapped index instead of loading its own copy.
+preload_app = True
+
+# One worker process per CPU, each serving several requests at once in threads.
+# Scoring holds the GIL, so the processes give the parallelism and the threads hide the network waits.
+workers = int(os.environ.get("SEARCH_WORKERS", os.cpu_count() or 1))
+worker_class = "gthread"
+threads = int(os.environ.get("SEARCH_THREADS", 4))
+
+# Idle keep-alive connections are closed after this many seconds.
+keepalive = 5
+timeout = 30
+
+
+def worker_exit(server, worker):
+    """
+    Function run in every worker process when it exits, to save the stems it cached for the next start.
+    The master process loaded the app before forking but never searches, so it never saves its cold cache.
+    :param server: The gunicorn arbiter.
+    :param worker: The exiting worker.
+    """
+
+    from search_engine_web_app import searcher
+
+    searcher.save_stem_cache()
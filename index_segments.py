@@ -0,0 +1,713 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+############################################################################################
+# SEGMENTED INDEX (inside the TF-IDF files directory)                                      #
+#                                                                                          #
+# current_index.json     : Directory of the binary index of the last full build, index_B/  #
+#                          for the B-th build. Every build writes a new directory and      #
+#                          replaces this file atomically, so mapped files never change.    #
+# manifest.json          : Generation, segments in document id order, the running document #
+#                          frequencies file and the full build the segments started from.  #
+#                          Replaced atomically on every commit.                            #
+# index_B/               : First segment, the binary index of the last full build.         #
+# segments/segment_N/    : Segment of the documents added by one update (a binary index).  #
+# segments/*.deleted_G.npy : Deleted documents of a segment (bool, by local document id).  #
+# segments/document_frequency_G.json : Total live documents and document frequencies.      #
+#                                                                                          #
+# A document is deleted by marking it in its segment and added again in a new segment, so  #
+# an update only writes the changed documents. Every file of a generation is new, so a     #
+# reader which opened an older manifest keeps a consistent view.                           #
+############################################################################################
+
+import os
+import json
+import math
+import bisect
+import shutil
+import threading
+import collections
+import numpy as np
+
+from binary_index import BinaryIndex
+from binary_index import BinaryIndexWriter
+from binary_index import add_document_terms
+
+TF_IDF_FILES_DIR = "./tf_idf_files"
+DATA_DIR = "./documents"
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+CURRENT_INDEX_FILE = "current_index.json"
+
+# Directory of the indexes built before there was a current index file.
+LEGACY_INDEX_DIR = "index"
+
+# Past MAX_SEGMENTS segments, the MERGE_FACTOR smallest segments are merged into one.
+MAX_SEGMENTS = 8
+MERGE_FACTOR = 4
+
+# Only one update or merge commits a manifest at a time.
+manifest_lock = threading.Lock()
+
+
+def read_current_index(tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to read which directory holds the binary index of the last full build.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return current_index: Number of the build and path of its index, relative to the TF-IDF files directory.
+    """
+
+    current_index_path = os.path.join(tf_idf_files_dir, CURRENT_INDEX_FILE)
+    if not os.path.isfile(current_index_path):
+
+        return {"BUILD": 0, "PATH": LEGACY_INDEX_DIR}
+
+    with open(current_index_path, "r") as cf:
+
+        return json.load(cf)
+
+
+def write_current_index(tf_idf_files_dir, current_index):
+    """
+    Function to switch to the binary index of a new full build, replacing the current index file atomically.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param current_index: Number of the build and path of its index.
+    """
+
+    current_index_path = os.path.join(tf_idf_files_dir, CURRENT_INDEX_FILE)
+    with open(current_index_path + ".tmp", "w") as cf:
+
+        json.dump(current_index, cf)
+
+    os.replace(current_index_path + ".tmp", current_index_path)
+
+
+def read_manifest(tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to read the manifest of the segmented index.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return manifest: The manifest, or None if the index is not segmented.
+    """
+
+    manifest_path = os.path.join(tf_idf_files_dir, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+
+        return None
+
+    with open(manifest_path, "r") as mf:
+
+        return json.load(mf)
+
+
+def write_manifest(tf_idf_files_dir, manifest):
+    """
+    Function to commit a new generation of the manifest, replacing the old one atomically.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param manifest: The manifest.
+    """
+
+    manifest_path = os.path.join(tf_idf_files_dir, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w") as mf:
+
+        json.dump(manifest, mf)
+
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def read_document_frequency(tf_idf_files_dir, manifest):
+    """
+    Function to read the running document frequencies of a manifest.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param manifest: The manifest.
+    :return total_documents: Number of live documents.
+    :return document_frequency: Number of live documents in which each word appears.
+    """
+
+    with open(os.path.join(tf_idf_files_dir, manifest["DOCUMENT_FREQUENCY"]), "r") as df_file:
+
+        document_frequency_data = json.load(df_file)
+
+    return document_frequency_data["TOTAL_DOCUMENTS"], collections.Counter(document_frequency_data["DOCUMENT_FREQUENCY"])
+
+
+def write_document_frequency(tf_idf_files_dir, generation, total_documents, document_frequency):
+    """
+    Function to write the running document frequencies of a new generation.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param generation: Generation of the manifest which refers to them.
+    :param total_documents: Number of live documents.
+    :param document_frequency: Number of live documents in which each word appears.
+    :return path: Path of the file, relative to the TF-IDF files directory.
+    """
+
+    path = os.path.join(SEGMENTS_DIR, "document_frequency_{}.json".format(generation))
+    document_frequency = dict((word, count) for word, count in document_frequency.items() if count > 0)
+    with open(os.path.join(tf_idf_files_dir, path), "w") as df_file:
+
+        json.dump({"TOTAL_DOCUMENTS": total_documents, "DOCUMENT_FREQUENCY": document_frequency}, df_file)
+
+    return path
+
+
+def remove_unused_files(tf_idf_files_dir, manifest):
+    """
+    Function to remove the deleted documents and document frequencies files of older generations.
+    Readers load them fully when they open the index, so only the files of the manifest are kept.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param manifest: The committed manifest.
+    """
+
+    used_files = set([manifest["DOCUMENT_FREQUENCY"]] + [segment["DELETED"] for segment in manifest["SEGMENTS"]])
+    for file_name in os.listdir(os.path.join(tf_idf_files_dir, SEGMENTS_DIR)):
+
+        path = os.path.join(SEGMENTS_DIR, file_name)
+        if os.path.isfile(os.path.join(tf_idf_files_dir, path)) and path not in used_files:
+
+            os.remove(os.path.join(tf_idf_files_dir, path))
+
+
+def create_manifest(tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to start a segmented index from the binary index of the last full build, as its first segment.
+    The manifest is committed with the first update, so searchers never see a generation without one.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return manifest: The first manifest, not committed yet.
+    """
+
+    os.makedirs(os.path.join(tf_idf_files_dir, SEGMENTS_DIR), exist_ok=True)
+
+    current_index = read_current_index(tf_idf_files_dir)
+    index_path = current_index["PATH"]
+    index = BinaryIndex(os.path.join(tf_idf_files_dir, index_path))
+    document_frequency = dict()
+    for term_number in range(index.number_of_words):
+
+        document_frequency[index.word_at(term_number)] = int(index.document_frequencies[term_number])
+
+    manifest = {
+        "GENERATION": 1,
+        "NEXT_SEGMENT": 1,
+        "SEGMENTS": [{"PATH": index_path, "DELETED": None}],
+        "DOCUMENT_FREQUENCY": write_document_frequency(tf_idf_files_dir, 1, index.number_of_documents, document_frequency),
+        "CURRENT_INDEX": current_index
+    }
+
+    return manifest
+
+
+def load_deleted(tf_idf_files_dir, segment, number_of_documents):
+    """
+    Function to read the deleted documents of a segment.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param segment: Manifest entry of the segment.
+    :param number_of_documents: Number of documents in the segment.
+    :return deleted: Boolean array, True for the deleted documents.
+    """
+
+    if segment["DELETED"] is None:
+
+        return np.zeros(number_of_documents, dtype=bool)
+
+    return np.load(os.path.join(tf_idf_files_dir, segment["DELETED"]))
+
+
+def read_documents(document_numbers, data_dir=DATA_DIR):
+    """
+    Function to read the term frequencies of documents.
+    :param document_numbers: Numbers of the documents, their names in the documents directory.
+    :param data_dir: Directory of the documents.
+    :return documents: List of (url, mapping of word and its TF).
+    """
+
+    documents = list()
+    for document_number in document_numbers:
+
+        with open(os.path.join(data_dir, "{}.json".format(document_number)), "r") as jf:
+
+            url_text_dict = dict(json.load(jf))
+
+        url_word_count_map = url_text_dict["WORD_COUNT_MAP"]
+        total_words = sum(list(url_word_count_map.values()))
+        term_frequencies = dict((word, word_count / total_words) for word, word_count in url_word_count_map.items())
+        documents.append((url_text_dict["URL"], term_frequencies))
+
+    return documents
+
+
+def write_segment(segment_dir, urls, words, doc_ids, term_frequencies, total_documents, document_frequency):
+    """
+    Function to write the postings of some documents as a new segment.
+    The document norms are computed with the IDF of the running document frequencies.
+    :param segment_dir: Directory of the segment.
+    :param urls: Url of every document, indexed by its local document id.
+    :param words: Word of every posting.
+    :param doc_ids: Local document id of every posting.
+    :param term_frequencies: TF of every posting.
+    :param total_documents: Number of live documents in the whole index.
+    :param document_frequency: Number of live documents in which each word appears.
+    """
+
+    # Words of the segment, and the word number of every posting.
+    segment_words = sorted(set(words))
+    word_numbers = dict((word, number) for number, word in enumerate(segment_words))
+    posting_words = np.array([word_numbers[word] for word in words], dtype=np.int64)
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    term_frequencies = np.asarray(term_frequencies, dtype=np.float64)
+
+    idfs = np.array([math.log(total_documents / document_frequency[word]) for word in segment_words])
+
+    # L2 norm of every document vector.
+    norms = np.bincount(doc_ids, weights=(term_frequencies * idfs[posting_words]) ** 2, minlength=len(urls)) ** (1 / 2)
+
+    # Postings in word order, then document id order.
+    order = np.lexsort((doc_ids, posting_words))
+    posting_words, doc_ids, term_frequencies = posting_words[order], doc_ids[order], term_frequencies[order]
+    boundaries = np.searchsorted(posting_words, np.arange(len(segment_words) + 1))
+
+    index_writer = BinaryIndexWriter(segment_dir, document_terms=True)
+    for number, word in enumerate(segment_words):
+
+        start, end = boundaries[number], boundaries[number + 1]
+        index_writer.add_word(word, doc_ids[start:end], term_frequencies[start:end], norms)
+
+    index_writer.close(urls, norms)
+
+
+def delete_documents(tf_idf_files_dir, manifest, urls_to_delete, document_frequency):
+    """
+    Function to mark documents as deleted in their segments, and remove them from the document frequencies.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param manifest: The manifest, whose segments get new deleted files.
+    :param urls_to_delete: Urls of the documents to delete.
+    :param document_frequency: Running document frequencies, updated in place.
+    :return number_deleted: Number of live documents deleted.
+    """
+
+    urls_to_delete = set(urls_to_delete)
+    number_deleted = 0
+
+    for segment in manifest["SEGMENTS"]:
+
+        index = BinaryIndex(os.path.join(tf_idf_files_dir, segment["PATH"]))
+        deleted = load_deleted(tf_idf_files_dir, segment, index.number_of_documents).copy()
+
+        # Only the urls to delete are looked up, with a binary search over the sorted urls of the segment.
+        newly_deleted = [
+            doc_id for url in urls_to_delete for doc_id in index.find_url(url) if not deleted[doc_id]
+        ]
+
+        if not newly_deleted:
+
+            continue
+
+        # The index of a full build gets the term numbers of its documents the first time one of them is deleted.
+        if index.document_terms is None:
+
+            add_document_terms(index.index_dir)
+            index = BinaryIndex(index.index_dir)
+
+        # Every word of the deleted documents loses one document. Only the words of those documents are read.
+        term_numbers, counts = np.unique(
+            np.concatenate([index.terms_of_document(doc_id) for doc_id in newly_deleted]),
+            return_counts=True
+        )
+        for term_number, count in zip(term_numbers.tolist(), counts.tolist()):
+
+            document_frequency[index.word_at(term_number)] -= count
+
+        deleted[newly_deleted] = True
+        number_deleted += len(newly_deleted)
+
+        segment["DELETED"] = os.path.join(
+            SEGMENTS_DIR,
+            "{}.deleted_{}.npy".format(os.path.basename(segment["PATH"]), manifest["GENERATION"] + 1)
+        )
+        np.save(os.path.join(tf_idf_files_dir, segment["DELETED"]), deleted)
+
+    return number_deleted
+
+
+def update_index(document_numbers, urls_to_delete, tf_idf_files_dir=TF_IDF_FILES_DIR, data_dir=DATA_DIR, before_commit=None):
+    """
+    Function to update the segmented index with added, changed and removed documents, without a full rebuild.
+    Documents of urls_to_delete are marked as deleted, then the documents are added as one new segment.
+    A changed document is both deleted and added.
+    :param document_numbers: Numbers of the added and changed documents.
+    :param urls_to_delete: Urls of the changed and removed documents.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param data_dir: Directory of the documents.
+    :param before_commit: Function called with the new manifest once its files are written, before it is committed.
+    :return manifest: The committed manifest.
+    """
+
+    with manifest_lock:
+
+        manifest = read_manifest(tf_idf_files_dir)
+        if manifest is None:
+
+            manifest = create_manifest(tf_idf_files_dir)
+
+        total_documents, document_frequency = read_document_frequency(tf_idf_files_dir, manifest)
+
+        # Deleted documents leave the running document frequencies.
+        total_documents -= delete_documents(tf_idf_files_dir, manifest, urls_to_delete, document_frequency)
+
+        # Added documents join them, before their norms are computed.
+        documents = read_documents(document_numbers, data_dir)
+        urls, words, doc_ids, term_frequencies = list(), list(), list(), list()
+        for doc_id, (url, document_term_frequencies) in enumerate(documents):
+
+            urls.append(url)
+            document_frequency.update(document_term_frequencies.keys())
+            for word, tf in document_term_frequencies.items():
+
+                words.append(word)
+                doc_ids.append(doc_id)
+                term_frequencies.append(tf)
+
+        total_documents += len(documents)
+
+        if documents:
+
+            segment_path = os.path.join(SEGMENTS_DIR, "segment_{}".format(manifest["NEXT_SEGMENT"]))
+            write_segment(
+                os.path.join(tf_idf_files_dir, segment_path),
+                urls, words, doc_ids, term_frequencies,
+                total_documents, document_frequency
+            )
+            manifest["SEGMENTS"].append({"PATH": segment_path, "DELETED": None})
+            manifest["NEXT_SEGMENT"] += 1
+
+        # The new generation is searchable as soon as the manifest is replaced.
+        manifest["GENERATION"] += 1
+        manifest["DOCUMENT_FREQUENCY"] = write_document_frequency(
+            tf_idf_files_dir,
+            manifest["GENERATION"],
+            total_documents,
+            document_frequency
+        )
+
+        if before_commit is not None:
+
+            before_commit(manifest)
+
+        write_manifest(tf_idf_files_dir, manifest)
+        remove_unused_files(tf_idf_files_dir, manifest)
+
+    return manifest
+
+
+def merge_segments(segment_paths, tf_idf_files_dir=TF_IDF_FILES_DIR, before_commit=None):
+    """
+    Function to merge segments into one, dropping their deleted documents.
+    The merged norms are computed again with the current IDF. The merge works on a snapshot of the manifest,
+    and documents deleted from the merged segments meanwhile are carried over to the new segment.
+    :param segment_paths: Paths of the segments to merge, consecutive in the manifest.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param before_commit: Function called with the new manifest once its files are written, before it is committed.
+    :return merged: True if the merge was committed, False if the segments changed meanwhile.
+    """
+
+    with manifest_lock:
+
+        manifest = read_manifest(tf_idf_files_dir)
+        segments = [segment for segment in manifest["SEGMENTS"] if segment["PATH"] in segment_paths]
+        merged_path = os.path.join(SEGMENTS_DIR, "segment_{}".format(manifest["NEXT_SEGMENT"]))
+        manifest["NEXT_SEGMENT"] += 1
+        write_manifest(tf_idf_files_dir, manifest)
+
+    total_documents, document_frequency = read_document_frequency(tf_idf_files_dir, manifest)
+
+    # Live documents of every segment get consecutive ids in the merged segment.
+    urls, words, doc_ids, term_frequencies = list(), list(), list(), list()
+    new_doc_ids = list()
+    for segment in segments:
+
+        index = BinaryIndex(os.path.join(tf_idf_files_dir, segment["PATH"]))
+        live = ~load_deleted(tf_idf_files_dir, segment, index.number_of_documents)
+
+        segment_new_doc_ids = np.cumsum(live) - 1 + len(urls)
+        segment_new_doc_ids[~live] = -1
+        new_doc_ids.append(segment_new_doc_ids)
+
+        urls += [index.url(doc_id) for doc_id in np.flatnonzero(live)]
+
+        segment_term_numbers, segment_doc_ids, segment_term_frequencies = index.all_term_frequencies()
+        live_postings = live[segment_doc_ids]
+        segment_words = [index.word_at(term_number) for term_number in range(index.number_of_words)]
+        words += [segment_words[term_number] for term_number in segment_term_numbers[live_postings]]
+        doc_ids.append(segment_new_doc_ids[segment_doc_ids[live_postings]])
+        term_frequencies.append(segment_term_frequencies[live_postings])
+
+    write_segment(
+        os.path.join(tf_idf_files_dir, merged_path),
+        urls, words,
+        np.concatenate(doc_ids) if doc_ids else [],
+        np.concatenate(term_frequencies) if term_frequencies else [],
+        total_documents, document_frequency
+    )
+
+    with manifest_lock:
+
+        manifest = read_manifest(tf_idf_files_dir)
+        positions = [i for i, segment in enumerate(manifest["SEGMENTS"]) if segment["PATH"] in segment_paths]
+
+        # Another merge took some of the segments.
+        if len(positions) != len(segments):
+
+            shutil.rmtree(os.path.join(tf_idf_files_dir, merged_path), ignore_errors=True)
+            return False
+
+        # Documents deleted since the snapshot are deleted in the merged segment too.
+        deleted = np.zeros(len(urls), dtype=bool)
+        for position, segment, segment_new_doc_ids in zip(positions, segments, new_doc_ids):
+
+            current_deleted = load_deleted(tf_idf_files_dir, manifest["SEGMENTS"][position], len(segment_new_doc_ids))
+            carried_over = segment_new_doc_ids[current_deleted]
+            deleted[carried_over[carried_over >= 0]] = True
+
+        merged_segment = {"PATH": merged_path, "DELETED": None}
+        if deleted.any():
+
+            merged_segment["DELETED"] = os.path.join(
+                SEGMENTS_DIR,
+                "{}.deleted_{}.npy".format(os.path.basename(merged_path), manifest["GENERATION"] + 1)
+            )
+            np.save(os.path.join(tf_idf_files_dir, merged_segment["DELETED"]), deleted)
+
+        old_segments = [manifest["SEGMENTS"][position] for position in positions]
+        manifest["SEGMENTS"] = (
+            manifest["SEGMENTS"][:positions[0]] + [merged_segment] +
+            [segment for segment in manifest["SEGMENTS"][positions[0]:] if segment["PATH"] not in segment_paths]
+        )
+        manifest["GENERATION"] += 1
+
+        if before_commit is not None:
+
+            before_commit(manifest)
+
+        write_manifest(tf_idf_files_dir, manifest)
+        remove_unused_files(tf_idf_files_dir, manifest)
+
+    # Readers which opened the old segments keep them mapped after they are removed.
+    for segment in old_segments:
+
+        shutil.rmtree(os.path.join(tf_idf_files_dir, segment["PATH"]), ignore_errors=True)
+
+    return True
+
+
+class SegmentMerger(threading.Thread):
+    """
+    Background thread merging the smallest segments while there are more than MAX_SEGMENTS.
+    Searches keep using the last committed manifest while a merge runs.
+    """
+
+    def __init__(self, tf_idf_files_dir=TF_IDF_FILES_DIR, before_commit=None):
+        """
+        Function to set up the merger thread.
+        :param tf_idf_files_dir: Directory of the TF-IDF files.
+        :param before_commit: Function called with every merged manifest before it is committed.
+        """
+
+        threading.Thread.__init__(self, daemon=True)
+        self.tf_idf_files_dir = tf_idf_files_dir
+        self.before_commit = before_commit
+
+    def run(self):
+        """
+        Function to merge segments until there are at most MAX_SEGMENTS.
+        """
+
+        while True:
+
+            manifest = read_manifest(self.tf_idf_files_dir)
+            if manifest is None or len(manifest["SEGMENTS"]) <= MAX_SEGMENTS:
+
+                break
+
+            # Consecutive segments, so the document ids keep the order of the manifest.
+            sizes = [
+                len(np.load(os.path.join(self.tf_idf_files_dir, segment["PATH"], "url_offsets.npy"), mmap_mode="r"))
+                for segment in manifest["SEGMENTS"]
+            ]
+            merge_factor = max(2, min(MERGE_FACTOR, len(sizes)))
+            window_sizes = [sum(sizes[i:i + merge_factor]) for i in range(len(sizes) - merge_factor + 1)]
+            start = int(np.argmin(window_sizes))
+            segment_paths = [segment["PATH"] for segment in manifest["SEGMENTS"][start:start + merge_factor]]
+
+            print("Merging {} segments.".format(len(segment_paths)))
+            merge_segments(segment_paths, self.tf_idf_files_dir, self.before_commit)
+
+
+class SegmentedIndex(object):
+    """
+    Read-only view over the segments of one manifest generation, with the same interface as BinaryIndex.
+    Document ids are global: the base of the segment plus the local document id. Deleted documents
+    are left out of the postings and have a zero norm, and the IDF comes from the running document frequencies.
+    """
+
+    def __init__(self, tf_idf_files_dir=TF_IDF_FILES_DIR, manifest=None):
+        """
+        Function to open every segment of a manifest.
+        :param tf_idf_files_dir: Directory of the TF-IDF files.
+        :param manifest: Manifest whose files are written, or None for the committed manifest.
+        """
+
+        if manifest is None:
+
+            manifest = read_manifest(tf_idf_files_dir)
+
+        self.generation = manifest["GENERATION"]
+
+        # Full build the segments started from, unknown for the manifests written before it was recorded.
+        self.current_index = manifest.get("CURRENT_INDEX")
+
+        self.segments = list()
+        self.deleted = list()
+        self.bases = list()
+        base = 0
+        for segment in manifest["SEGMENTS"]:
+
+            index = BinaryIndex(os.path.join(tf_idf_files_dir, segment["PATH"]))
+            self.segments.append(index)
+            self.deleted.append(load_deleted(tf_idf_files_dir, segment, index.number_of_documents))
+            self.bases.append(base)
+            base += index.number_of_documents
+
+        self.number_of_documents = base
+        self.total_documents, self.document_frequency = read_document_frequency(tf_idf_files_dir, manifest)
+
+        # Deleted documents can never be similar to a query.
+        self.norms = np.concatenate([np.asarray(index.norms, dtype=np.float64) for index in self.segments] or [np.zeros(0)])
+        self.norms[np.concatenate(self.deleted or [np.zeros(0, dtype=bool)])] = 0
+
+        # Term dictionary over all the segments.
+        self.words = sorted(self.document_frequency.keys())
+        self.word_numbers = dict((word, number) for number, word in enumerate(self.words))
+        self.number_of_words = len(self.words)
+
+    def word_at(self, term_number):
+        """
+        Function to get the word of a term number.
+        :param term_number: Position of the word in the sorted term dictionary.
+        :return word: The word.
+        """
+
+        return self.words[term_number]
+
+    def find_word(self, word):
+        """
+        Function to find the term number of a word.
+        :param word: Word to find.
+        :return term_number: Position of the word in the term dictionary, or -1 if it is not there.
+        """
+
+        return self.word_numbers.get(word, -1)
+
+    def url(self, doc_id):
+        """
+        Function to get the url of a document.
+        :param doc_id: Global document id.
+        :return url: Url of the document.
+        """
+
+        segment_number = bisect.bisect_right(self.bases, doc_id) - 1
+
+        return self.segments[segment_number].url(doc_id - self.bases[segment_number])
+
+    def idf(self, word):
+        """
+        Function to get the inverse document frequency of a word.
+        :param word: The word.
+        :return idf: Inverse document frequency of the word, or None if no live document has it.
+        """
+
+        if self.document_frequency.get(word, 0) <= 0:
+
+            return None
+
+        return math.log(self.total_documents / self.document_frequency[word])
+
+    def max_score(self, word):
+        """
+        Function to get the largest weight / document norm in the postings of a word, over all the segments.
+        :param word: The word.
+        :return max_score: Largest normalized weight of the word, 0 if it is not in the index.
+        """
+
+        idf = self.idf(word)
+        if idf is None:
+
+            return 0
+
+        max_term_frequency = 0
+        for index in self.segments:
+
+            term_number = index.find_word(word)
+            if term_number >= 0:
+
+                max_term_frequency = max(max_term_frequency, float(index.max_term_frequencies[term_number]))
+
+        return max_term_frequency * idf
+
+    def postings(self, word):
+        """
+        Function to decode the postings list of a word from every segment, without the deleted documents.
+        :param word: The word.
+        :return doc_ids: Global document ids in increasing order, empty if the word is not in the index.
+        :return weights: TF-IDF weight of the word in every document.
+        """
+
+        idf = self.idf(word)
+        all_doc_ids, all_weights = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.float64)]
+        if idf is None:
+
+            return all_doc_ids[0], all_weights[0]
+
+        for index, deleted, base in zip(self.segments, self.deleted, self.bases):
+
+            term_number = index.find_word(word)
+            if term_number < 0:
+
+                continue
+
+            doc_ids, term_frequencies = index.term_frequencies_at(term_number)
+            live = ~deleted[doc_ids]
+            all_doc_ids.append(doc_ids[live] + base)
+            all_weights.append(term_frequencies[live] * idf)
+
+        # Segments are in document id order, so the concatenation is sorted.
+        return np.concatenate(all_doc_ids), np.concatenate(all_weights)
+
+    def all_postings(self):
+        """
+        Function to decode every postings list of every segment at once, without the deleted documents.
+        :return term_numbers: Term number of every posting.
+        :return doc_ids: Global document id of every posting.
+        :return weights: TF-IDF weight of every posting.
+        """
+
+        idfs = np.array([math.log(self.total_documents / self.document_frequency[word]) for word in self.words])
+
+        all_term_numbers, all_doc_ids, all_weights = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+        for index, deleted, base in zip(self.segments, self.deleted, self.bases):
+
+            term_numbers, doc_ids, term_frequencies = index.all_term_frequencies()
+            live = ~deleted[doc_ids]
+
+            # Term numbers of the segment, in the term dictionary of all the segments.
+            global_term_numbers = np.array(
+                [self.word_numbers.get(index.word_at(term_number), -1) for term_number in range(index.number_of_words)],
+                dtype=np.int64
+            )
+            term_numbers = global_term_numbers[term_numbers[live]]
+
+            all_term_numbers.append(term_numbers)
+            all_doc_ids.append(doc_ids[live] + base)
+            all_weights.append(term_frequencies[live] * idfs[term_numbers])
+
+        return np.concatenate(all_term_numbers), np.concatenate(all_doc_ids), np.concatenate(all_weights)
@@ -12,128 +12,221 @@
 
 import operator
 import numpy as np
+from scipy import sparse
 
 # Globals..
 EPSILON = 0.15
 
 # It takes 52 iterations to get converging page ranks of a web graph with 322 Million documents.
-# Our data has close to 5000 documents. For this web graph, 20 iterations is more than enough.
-ITERATIONS = 20
+# Iterations stop once the page ranks change by less than TOLERANCE (L1 distance), or after ITERATIONS.
+ITERATIONS = 100
+TOLERANCE = 1.0e-8
 
 
-def get_incoming_connections(web_graph):
+def add_links(url_numbers, parent_nodes, outgoing_connections):
     """
-    Function to get the number of incoming nodes because "S (B)" in the formula.
+    Function to number the urls of some links, giving new urls the next numbers.
+    :param url_numbers: Mapping of every known url and its number, extended in place.
+    :param parent_nodes: Nodes whose outgoing links are added.
+    :param outgoing_connections: Outgoing links of every node, in the same order.
+    :return parents: Number of the parent (B) of every link B -> A.
+    :return children: Number of the child (A) of every link B -> A.
+    """
+
+    for node in parent_nodes:
+
+        url_numbers.setdefault(node, len(url_numbers))
+
+    # All the outgoing links are looked up in one pass. A repeated link counts once per occurrence.
+    number_of_links = np.fromiter((len(links) for links in outgoing_connections), dtype=np.int64, count=len(outgoing_connections))
+    children = np.fromiter(
+        (url_numbers.setdefault(child_node, len(url_numbers)) for links in outgoing_connections for child_node in links),
+        dtype=np.int64,
+        count=int(number_of_links.sum())
+    )
+    parents = np.repeat(np.array([url_numbers[node] for node in parent_nodes], dtype=np.int64), number_of_links)
+
+    return parents, children
+
+
+def build_link_matrix(web_graph):
+    """
+    Function to build the sparse link matrix of the web graph.
+    Links to urls outside the web graph are kept too, so they count as soon as those urls join the web graph.
     :param web_graph: The dictionary structure of the web structure.
-    :return incomming_connections: Incomming nodes dicitonary.
+    :return urls: Every node of the web graph and every url they link to, in the order of the matrix rows and columns.
+    :return in_web_graph: Boolean array of the urls which are nodes of the web graph.
+    :return link_matrix: CSR matrix where row B, column A is the number of links B -> A.
     """
 
-    # Nodes in the web graph
+    # Nodes in the web graph come first, in the order of the web graph.
     web_graph_nodes = list(web_graph.keys())
+    url_numbers = dict((node, number) for number, node in enumerate(web_graph_nodes))
+
+    parents, children = add_links(url_numbers, web_graph_nodes, [web_graph[node] for node in web_graph_nodes])
 
-    # Get the incoming connections
-    incoming_connections = dict()
+    urls = list(url_numbers.keys())
+    in_web_graph = np.arange(len(urls)) < len(web_graph_nodes)
 
-    for parent_node, outgoing_connections in web_graph.items():
+    # Duplicated entries are summed when the matrix is built.
+    link_matrix = sparse.csr_matrix(
+        (np.ones(len(parents)), (parents, children)),
+        shape=(len(urls), len(urls))
+    )
 
-        for child_node in outgoing_connections:
+    return urls, in_web_graph, link_matrix
 
-            if child_node not in incoming_connections:
 
-                incoming_connections[child_node] = [parent_node]
+def update_link_matrix(urls, in_web_graph, link_matrix, changed_nodes, removed_nodes):
+    """
+    Function to apply the changes of a re-crawl to the link matrix, touching only the rows of the changed nodes.
+    :param urls: Every known url, in the order of the matrix rows and columns.
+    :param in_web_graph: Boolean array of the urls which are nodes of the web graph.
+    :param link_matrix: CSR matrix where row B, column A is the number of links B -> A.
+    :param changed_nodes: Mapping of the added and changed nodes with all their outgoing links.
+    :param removed_nodes: Nodes which are not in the web anymore.
+    :return urls: Every known url, with the new ones at the end.
+    :return in_web_graph: Boolean array of the urls which are nodes of the changed web graph.
+    :return link_matrix: Link matrix of the changed web graph.
+    """
 
-            else:
+    url_numbers = dict((url, number) for number, url in enumerate(urls))
+    changed_parent_nodes = list(changed_nodes.keys())
+    parents, children = add_links(url_numbers, changed_parent_nodes, [changed_nodes[node] for node in changed_parent_nodes])
 
-                incoming_connections[child_node].append(parent_node)
+    urls = list(url_numbers.keys())
+    total_urls = len(urls)
 
-    # Some nodes do not have any incoming connections.
-    # For them initialize an empty list.
-    for node in web_graph_nodes:
+    # New urls get empty rows and columns.
+    link_matrix = link_matrix.tocsr(copy=True)
+    link_matrix.resize((total_urls, total_urls))
+    in_web_graph = np.concatenate((in_web_graph, np.zeros(total_urls - len(in_web_graph), dtype=bool)))
 
-        if node not in incoming_connections:
+    # Removed and changed nodes lose their outgoing links, and the changed nodes get their new ones.
+    # A removed node stays a url, since other nodes may still link to it.
+    removed_numbers = [url_numbers[node] for node in removed_nodes if node in url_numbers]
+    cleared_rows = np.ones(total_urls)
+    cleared_rows[removed_numbers] = 0
+    cleared_rows[[url_numbers[node] for node in changed_parent_nodes]] = 0
+    link_matrix = sparse.diags(cleared_rows) @ link_matrix
+    link_matrix = link_matrix + sparse.csr_matrix(
+        (np.ones(len(parents)), (parents, children)),
+        shape=(total_urls, total_urls)
+    )
+    link_matrix.eliminate_zeros()
 
-            incoming_connections[node] = []
+    in_web_graph[removed_numbers] = False
+    in_web_graph[[url_numbers[node] for node in changed_parent_nodes]] = True
 
-    return incoming_connections
+    return urls, in_web_graph, link_matrix
 
 
-def get_outgoing_connections_count(web_graph):
+def build_transition_matrix(in_web_graph, link_matrix):
     """
-    Function to get the number of outgoing links of a node because of "OUT (B)" in the formula.
-    :param web_graph: The dictionary structure of the web structure.
-    :return outgoing_number_of_connections: The numbe of outgoing links.
+    Function to build the sparse transition matrix of the web graph from its link matrix.
+    Only links between nodes of the web graph are kept, each weighted by 1 / OUT (B).
+    :param in_web_graph: Boolean array of the urls which are nodes of the web graph.
+    :param link_matrix: CSR matrix where row B, column A is the number of links B -> A.
+    :return transition_matrix: CSR matrix where row A, column B is the share of S (B) given to A.
+    :return dangling_nodes: Boolean array of the nodes without outgoing links inside the web graph.
     """
 
-    # Build outgoing connections number
-    outgoing_number_of_connections = dict()
-    for parent_node, outgoing_connections in web_graph.items():
+    node_numbers = np.flatnonzero(in_web_graph)
+    node_links = link_matrix[node_numbers][:, node_numbers]
+
+    # OUT (B), counting only the links which stay inside the web graph.
+    outgoing_number_of_connections = np.asarray(node_links.sum(axis=1)).ravel()
+    dangling_nodes = outgoing_number_of_connections == 0
+
+    with np.errstate(divide="ignore"):
 
-        outgoing_number_of_connections[parent_node] = len(outgoing_connections)
+        inverse_outgoing = np.where(dangling_nodes, 0, 1 / outgoing_number_of_connections)
 
-    return outgoing_number_of_connections
+    transition_matrix = (sparse.diags(inverse_outgoing) @ node_links).T.tocsr()
 
+    return transition_matrix, dangling_nodes
 
-def get_page_ranks(web_graph):
+
+def get_initial_page_ranks(web_graph_nodes, previous_page_ranks):
     """
-    Main function for the Page Rank Algorithm happens here.
-    :paran web_graph: The dictionary structure of the web structure.
-    :return sorted_final_page_ranks: Converged and sorted page ranks of all nodes in the web graph.
+    Function to warm start the page ranks from the ones of the web graph before its changes.
+    Nodes which were already there start from their previous page rank and new nodes from 1 / N, scaled to add up to 1.
+    :param web_graph_nodes: Nodes in the web graph.
+    :param previous_page_ranks: Mapping of nodes and their previous page rank scores.
+    :return page_rank_scores: Initial page rank scores, in the order of the nodes.
     """
 
-    # Nodes in the web graph.
-    web_graph_nodes = list(web_graph.keys())
+    total_nodes = len(web_graph_nodes)
+    page_rank_scores = np.array([previous_page_ranks.get(node, 1 / total_nodes) for node in web_graph_nodes], dtype=np.float64)
 
-    # Number of outgoing connections.
-    outgoing_number_of_connections = get_outgoing_connections_count(web_graph)
+    return page_rank_scores / page_rank_scores.sum()
 
-    # Incoming connections nodes.
-    incoming_connections = get_incoming_connections(web_graph)
+
+def get_page_ranks_from_links(urls, in_web_graph, link_matrix, previous_page_ranks=None):
+    """
+    Main function for the Page Rank Algorithm happens here.
+    Power iteration with sparse matrix-vector products, keeping only the previous and the new page ranks.
+    The page rank of nodes without outgoing links is shared by all nodes, so no page rank is lost.
+    With the page ranks of the web graph before a small change, the iterations start from them
+    and only run until the scores around the change converge again.
+    :param urls: Every known url, in the order of the matrix rows and columns.
+    :param in_web_graph: Boolean array of the urls which are nodes of the web graph.
+    :param link_matrix: CSR matrix where row B, column A is the number of links B -> A.
+    :param previous_page_ranks: Mapping of nodes and their page rank scores before the change, or None to start from 1 / N.
+    :return sorted_final_page_ranks: Converged and sorted page ranks of all nodes in the web graph.
+    """
+
+    web_graph_nodes = [urls[number] for number in np.flatnonzero(in_web_graph)]
 
     # Total number of nodes (N).
     total_nodes = len(web_graph_nodes)
 
-    # Initialize page rank scores. 
-    # All nodes have 1 / N.
-    page_rank_scores = dict()
-    for node in web_graph_nodes:
-
-        page_rank_scores[node] = 1 / total_nodes
+    if total_nodes == 0:
 
-    # Initialize it to zeroth iteration.
-    page_rank_dict = dict()
-    page_rank_dict[0] = page_rank_scores
+        return list()
 
-    # Iterate and update the page ranks for 20 iterations or convergence whichever comes first.
-    for i in range(1, ITERATIONS):
-        print("Page Rank Iteration:", i)
+    transition_matrix, dangling_nodes = build_transition_matrix(in_web_graph, link_matrix)
 
-        node_rank_dict = dict()
-        for node in web_graph_nodes:
+    # Initialize page rank scores.
+    # All nodes have 1 / N, unless they start from their previous page ranks.
+    if previous_page_ranks:
 
-            # Get all the incoming nodes for this node.
-            incoming_nodes = incoming_connections[node]
+        page_rank_scores = get_initial_page_ranks(web_graph_nodes, previous_page_ranks)
 
-            # Now, get this part of formula.
-            # SUM OF ALL B -> A : S(B) / ALL_OUT(B)
-            temp_score = 0
-            for incoming_node in incoming_nodes:
+    else:
 
-                # Update based on previous iteration's page ranks.
-                previous_page_ranks_dict = page_rank_dict[i - 1]
-                temp_score += (previous_page_ranks_dict[incoming_node] / outgoing_number_of_connections[incoming_node])
+        page_rank_scores = np.full(total_nodes, 1 / total_nodes)
 
-            # Now, calculate new page rank.
-            rank_score = (EPSILON / total_nodes) + ((1 - EPSILON) * temp_score)
-            node_rank_dict[node] = rank_score
+    # Iterate and update the page ranks until convergence or ITERATIONS, whichever comes first.
+    for i in range(1, ITERATIONS + 1):
 
-        page_rank_dict[i] = node_rank_dict
+        # SUM OF ALL B -> A : S(B) / ALL_OUT(B), plus the share of the dangling nodes.
+        dangling_score = page_rank_scores[dangling_nodes].sum() / total_nodes
+        new_page_rank_scores = (EPSILON / total_nodes) + (1 - EPSILON) * (transition_matrix @ page_rank_scores + dangling_score)
 
         # Breaking condition.
-        if page_rank_dict[i] == page_rank_dict[i - 1]:
+        change = np.abs(new_page_rank_scores - page_rank_scores).sum()
+        page_rank_scores = new_page_rank_scores
+        print("Page Rank Iteration: {} (L1 change {})".format(i, change))
+
+        if change < TOLERANCE:
 
             break
 
-    final_page_ranks = node_rank_dict
+    final_page_ranks = dict(zip(web_graph_nodes, page_rank_scores.tolist()))
     sorted_final_page_ranks = sorted(final_page_ranks.items(), key=operator.itemgetter(1))
 
     return sorted_final_page_ranks
+
+
+def get_page_ranks(web_graph, previous_page_ranks=None):
+    """
+    Function to get the page ranks of a web graph.
+    :paran web_graph: The dictionary structure of the web structure.
+    :param previous_page_ranks: Mapping of nodes and their page rank scores before a change, or None to start from 1 / N.
+    :return sorted_final_page_ranks: Converged and sorted page ranks of all nodes in the web graph.
+    """
+
+    urls, in_web_graph, link_matrix = build_link_matrix(web_graph)
+
+    return get_page_ranks_from_links(urls, in_web_graph, link_matrix, previous_page_ranks)
@@ -0,0 +1,204 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import os
+import json
+import numpy as np
+
+from cosine_similarity import load_inverted_index
+from index_segments import MANIFEST_FILE
+from index_segments import read_current_index
+
+TF_IDF_FILES_DIR = "./tf_idf_files"
+PAGE_RANKS_FILE = "./web_page_ranks/web_ranks.json"
+
+# Page rank of every document id of the index, as float64, in a new file every time it is written.
+# The information file names the prior file and the index it is aligned with, and is replaced atomically,
+# so a reader never pairs a prior with the information of another one.
+PRIOR_FILE = "page_rank_prior_{}.npy"
+PRIOR_INFORMATION_FILE = "page_rank_prior.json"
+
+
+def get_page_rank_prior(inverted_index, page_ranks):
+    """
+    Function to get the page rank of every document id, divided by the largest one so it is between 0 and 1.
+    :param inverted_index: Binary index with the document urls.
+    :param page_ranks: Mapping of url and its page rank score.
+    :return page_rank_prior: Array of the page rank prior of every document id.
+    """
+
+    # Urls indexed since the page ranks were calculated have no page rank yet.
+    page_rank_prior = np.array(
+        [page_ranks.get(inverted_index.url(doc_id), 0) for doc_id in range(inverted_index.number_of_documents)],
+        dtype=np.float64
+    )
+
+    if len(page_rank_prior) > 0 and page_rank_prior.max() > 0:
+
+        page_rank_prior /= page_rank_prior.max()
+
+    return page_rank_prior
+
+
+def get_index_information(inverted_index):
+    """
+    Function to identify the document ids of an index.
+    :param inverted_index: Binary index, or the segments of an index updated incrementally.
+    :return index_information: Build and path of the full build (from current_index.json), generation of the
+                               segments (None for a full build) and number of document ids.
+    """
+
+    current_index = getattr(inverted_index, "current_index", None)
+
+    return {
+        "BUILD": current_index["BUILD"] if current_index is not None else None,
+        "PATH": current_index["PATH"] if current_index is not None else None,
+        "GENERATION": getattr(inverted_index, "generation", None),
+        "NUMBER_OF_DOCUMENTS": inverted_index.number_of_documents
+    }
+
+
+def read_prior_information(tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to read which prior file is the current one, and the index it is aligned with.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return prior_information: Information of the prior, or None if there is no prior.
+    """
+
+    information_path = os.path.join(tf_idf_files_dir, PRIOR_INFORMATION_FILE)
+    if os.path.isfile(information_path) is False:
+
+        return None
+
+    with open(information_path, "r") as inf:
+
+        return json.load(inf)
+
+
+def remove_unused_priors(tf_idf_files_dir, prior_file=None):
+    """
+    Function to remove the prior files which are not the current one.
+    Searchers which mapped an older prior keep it after it is removed.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param prior_file: Name of the current prior file, or None to remove every prior file.
+    """
+
+    for file_name in os.listdir(tf_idf_files_dir):
+
+        # page_rank_prior.npy is the single prior file written before the prior files were numbered.
+        is_prior = (file_name.startswith("page_rank_prior_") and file_name.endswith(".npy")) or file_name == "page_rank_prior.npy"
+        if is_prior and file_name != prior_file:
+
+            os.remove(os.path.join(tf_idf_files_dir, file_name))
+
+
+def read_page_ranks(page_ranks_file=PAGE_RANKS_FILE):
+    """
+    Function to read the sorted list of urls and page rank scores.
+    :param page_ranks_file: Path of the page ranks.
+    :return page_ranks: Mapping of url and its page rank score.
+    """
+
+    with open(page_ranks_file, "r") as rf:
+
+        return dict(json.load(rf))
+
+
+def write_page_rank_prior(tf_idf_files_dir=TF_IDF_FILES_DIR, page_ranks_file=PAGE_RANKS_FILE, inverted_index=None):
+    """
+    Function to write the page rank prior of every document id next to the index.
+    It runs whenever the index or the page ranks change, so the searcher can map it instead of reading the page ranks.
+    A new index gets its prior before it is committed, so a searcher opening it finds the prior aligned with it.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param page_ranks_file: Path of the page ranks.
+    :param inverted_index: Index about to be committed, or None for the current index.
+    """
+
+    information_path = os.path.join(tf_idf_files_dir, PRIOR_INFORMATION_FILE)
+
+    index_exists = inverted_index is not None or (
+        os.path.isfile(os.path.join(tf_idf_files_dir, MANIFEST_FILE)) or
+        os.path.isdir(os.path.join(tf_idf_files_dir, read_current_index(tf_idf_files_dir)["PATH"]))
+    )
+
+    if index_exists is False:
+
+        return
+
+    # Without page ranks, a prior of another index is removed rather than kept misaligned.
+    if os.path.isfile(page_ranks_file) is False:
+
+        if os.path.isfile(information_path):
+
+            os.remove(information_path)
+
+        remove_unused_priors(tf_idf_files_dir)
+        print("No page ranks yet, so no page rank prior is written.")
+        return
+
+    if inverted_index is None:
+
+        inverted_index = load_inverted_index(tf_idf_files_dir)
+
+    page_rank_prior = get_page_rank_prior(inverted_index, read_page_ranks(page_ranks_file))
+
+    # Every prior is written to a new file, so a searcher mapping the old prior keeps it.
+    previous_information = read_prior_information(tf_idf_files_dir)
+    prior_number = previous_information.get("PRIOR_NUMBER", 0) + 1 if previous_information is not None else 1
+    prior_file = PRIOR_FILE.format(prior_number)
+    with open(os.path.join(tf_idf_files_dir, prior_file), "wb") as pf:
+
+        np.save(pf, page_rank_prior)
+
+    # The new prior is the current one once the information file is replaced.
+    prior_information = get_index_information(inverted_index)
+    prior_information["PRIOR_NUMBER"] = prior_number
+    prior_information["PRIOR_FILE"] = prior_file
+    with open(information_path + ".tmp", "w") as inf:
+
+        json.dump(prior_information, inf)
+
+    os.replace(information_path + ".tmp", information_path)
+    remove_unused_priors(tf_idf_files_dir, prior_file)
+
+    print("Page rank prior written for {} document ids.".format(len(page_rank_prior)))
+
+
+def load_page_rank_prior(inverted_index, tf_idf_files_dir=TF_IDF_FILES_DIR):
+    """
+    Function to map the page rank prior of every document id.
+    The page ranks are never read here: the prior is written with every index, before it is committed.
+    :param inverted_index: Binary index, or the segments of an index updated incrementally.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :return page_rank_prior: Array of the page rank prior of every document id, or None if the saved prior
+                             is missing or belongs to another index.
+    """
+
+    prior_information = read_prior_information(tf_idf_files_dir)
+    if prior_information is None:
+
+        return None
+
+    prior_file = prior_information.pop("PRIOR_FILE", None)
+    prior_information.pop("PRIOR_NUMBER", None)
+    if prior_file is None or prior_information != get_index_information(inverted_index):
+
+        return None
+
+    try:
+
+        page_rank_prior = np.load(os.path.join(tf_idf_files_dir, prior_file), mmap_mode="r")
+
+    # A newer prior was written and this one removed since the information file was read.
+    except OSError:
+
+        return None
+
+    if len(page_rank_prior) != inverted_index.number_of_documents:
+
+        return None
+
+    return page_rank_prior
@@ -4,11 +4,14 @@
 @date: 05/06/2019
 """
 
-import re
 import math
 import nltk
 from pathlib import Path
 
+from caches import STEM_CACHE
+from clean_html import generate_terms
+from clean_html import get_stop_words
+
 QUERIES_PATH = "./sample_queries/sample_query_examples"
 
 
@@ -96,8 +99,9 @@ def preprocess_queries():
     """
 
     # Some initializations..
-    stopWords = set(nltk.corpus.stopwords.words("english"))
-    ps = nltk.stem.PorterStemmer()
+    # Stopwords are loaded once, and stems are cached with the ones of the documents.
+    stopWords = get_stop_words()
+    ps = STEM_CACHE
 
     # Get file path.
     queries_file_path = Path(QUERIES_PATH)
@@ -128,29 +132,64 @@ def preprocess_queries():
     preprocessed_query = list()
     for contents in queries_by_lines:
 
-        # To store the corpus of words
-        corpus = list()
+        preprocessed_query.append(clean_query_words(contents, stopWords, ps))
 
-        # Create corpus, remove special chars and lowercase operation.
-        for content in contents:
+    return preprocessed_query
 
-            content = re.sub('[^A-Za-z]+', '', content).lower()
-            corpus.append(content)
 
-        # Remove Stopwords before stemming
-        corpus = [word for word in corpus if word not in stopWords]
+def clean_query_words(contents, stopWords, ps):
+    """
+    Function to clean the tokens of one query.
+    :param contents: Tokens of the query.
+    :param stopWords: Set of stopwords.
+    :param ps: Porter Stemmer, or a stem cache in front of it.
+    :return corpus: Preprocessed words of the query.
+    """
 
-        # Integrate Porter Stemmer
-        corpus = [ps.stem(word) for word in corpus]
+    # Same terms as the documents, in one pass over the tokens.
+    corpus = list(generate_terms(contents, stopWords, ps))
 
-        # Remove Stopwords after stemming
-        corpus = [word for word in corpus if word not in stopWords]
+    return corpus
 
-        # Remove unnecessary empty strings from corpus
-        corpus = [word for word in corpus if word != '' and len(word) > 2]
-        preprocessed_query.append(corpus)
 
-    return preprocessed_query
+def preprocess_query_text(query_text):
+    """
+    Function to preprocess a single user query held in memory.
+    :param query_text: User's query.
+    :return query_words: Preprocessed words of the query.
+    """
+
+    # Some initializations..
+    # Stopwords are loaded once, and stems are cached with the ones of the documents.
+    stopWords = get_stop_words()
+    ps = STEM_CACHE
+
+    # The whole text is one query, so periods are not treated as query separators here.
+    contents = nltk.word_tokenize(query_text)
+
+    return clean_query_words(contents, stopWords, ps)
+
+
+def generate_query_TFIDF(query_words, idf_dict):
+    """
+    Function to generate TF-IDF for the words of a single query.
+    :param query_words: Preprocessed words of the query.
+    :param idf_dict: Inverse Document Frequency Mapping of the documents.
+    :return query_tf_idf_dict: TF-IDF Mapping of the query words.
+    """
+
+    query_tf_idf_dict = dict()
+
+    for word in query_words:
+
+        # Words which are not in any document can not match anything.
+        if word not in idf_dict:
+
+            continue
+
+        query_tf_idf_dict[word] = (query_words.count(word) / len(query_words)) * idf_dict[word]
+
+    return query_tf_idf_dict
 
 
 def queries_cleaning():
@@ -0,0 +1,279 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import os
+import json
+import hashlib
+import requests
+from uuid import uuid4
+
+from clean_html import extract_text_from_html
+from crawl_all_sites import CrawlFrontier
+from crawl_all_sites import REQUEST_TIMEOUT
+from crawl_all_sites import check_goodness
+from crawl_all_sites import get_outgoing_links
+from generate_data import DATA_DIRECTORY
+from generate_data import save_document
+from generate_data import create_document_contents
+
+# Validators, content hash and document number of every crawled url, kept between crawls.
+REGISTRY_FILE = "./documents_registry.json"
+
+# Documents added, changed and removed by the last incremental crawl.
+REPORT_FILE = "./recrawl_report.json"
+
+# Status codes of the pages which are gone. Any other failure is taken as temporary.
+GONE_STATUS_CODES = (404, 410)
+
+
+def get_document_hash(document_contents_map):
+    """
+    Function to hash the words and outgoing links of a document.
+    Two crawls of a page give the same hash when the page would give the same document, whatever changed in its markup.
+    :param document_contents_map: Contents of the document.
+    :return content_hash: SHA-1 of the document contents.
+    """
+
+    contents = json.dumps(
+        [document_contents_map["WORD_COUNT_MAP"], document_contents_map["OUTGOING_LINKS"]],
+        sort_keys=True
+    )
+
+    return hashlib.sha1(contents.encode("utf8")).hexdigest()
+
+
+def load_document(document_name_index):
+    """
+    Function to read a document.
+    :param document_name_index: Number of the document.
+    :return document_contents_map: Contents of the document.
+    """
+
+    with open(os.path.join(DATA_DIRECTORY, str(document_name_index) + ".json"), "r") as doc_file:
+
+        return dict(json.load(doc_file))
+
+
+def load_registry():
+    """
+    Function to read the registry of the crawled urls.
+    Without a registry, it is built from the documents of the last full crawl, without validators.
+    :return registry: Next document number and, for every url, its document number, ETag, Last-Modified and content hash.
+    """
+
+    if os.path.isfile(REGISTRY_FILE):
+
+        with open(REGISTRY_FILE, "r") as rf:
+
+            return json.load(rf)
+
+    registry = {"NEXT_INDEX": 1, "PAGES": dict()}
+
+    if os.path.isdir(DATA_DIRECTORY):
+
+        for document_name in os.listdir(DATA_DIRECTORY):
+
+            document_contents_map = load_document(os.path.splitext(document_name)[0])
+            registry["PAGES"][document_contents_map["URL"]] = {
+                "INDEX": document_contents_map["INDEX"],
+                "ETAG": None,
+                "LAST_MODIFIED": None,
+                "CONTENT_HASH": get_document_hash(document_contents_map)
+            }
+            registry["NEXT_INDEX"] = max(registry["NEXT_INDEX"], document_contents_map["INDEX"] + 1)
+
+    return registry
+
+
+def remove_registry():
+    """
+    Function to forget the crawled urls, when a new full crawl numbers the documents from 1 again.
+    """
+
+    if os.path.isfile(REGISTRY_FILE):
+
+        os.remove(REGISTRY_FILE)
+
+
+def save_registry(registry):
+    """
+    Function to write the registry of the crawled urls.
+    :param registry: Next document number and the entry of every url.
+    """
+
+    with open(REGISTRY_FILE, "w") as rf:
+
+        json.dump(registry, rf)
+
+
+def request_page_if_modified(session, url, page_entry):
+    """
+    Function to hit a site, asking for the page only if it changed since the last crawl.
+    :param session: Requests session, so the connections are reused.
+    :param url: URL to fetch.
+    :param page_entry: Registry entry of the url, or None if the url was never crawled.
+    :return url_response: Response of the site (200 with the page, 304 if unchanged, or an error), or None if the site is broken.
+    """
+
+    # Generating a random user agent as client, as in crawl_for_sites.
+    headers = {'User-agent': 'Some-Anonymous-User-{}'.format(uuid4())}
+
+    # Validators of the last crawl make the request conditional.
+    if page_entry is not None and page_entry["ETAG"] is not None:
+
+        headers["If-None-Match"] = page_entry["ETAG"]
+
+    if page_entry is not None and page_entry["LAST_MODIFIED"] is not None:
+
+        headers["If-Modified-Since"] = page_entry["LAST_MODIFIED"]
+
+    try:
+
+        url_response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    except Exception as e:
+
+        print("\nThe URL ({url}) is broken. Moving on with next site.".format(url=url))
+        print("Error: {error_description}".format(error_description=e))
+        return None
+
+    if url_response.status_code not in (200, 304):
+
+        print("\nThe URL ({url}) is unresponsive (status {status}).\n".format(url=url, status=url_response.status_code))
+
+    return url_response
+
+
+def recrawl_for_sites(main_url, number_of_pages_to_crawl, main_domain):
+    """
+    Function to crawl the sites again in BFS order, rewriting only the documents of the pages which changed.
+    Unchanged pages answer the conditional requests with 304 and their outgoing links are read from their documents.
+    Every url keeps its document number between crawls. Documents of urls which are gone (404 or 410) or not linked
+    anymore are removed. A page which can not be fetched for another reason keeps its document until the next crawl.
+    :param main_url: Initial point to start crawling.
+    :param number_of_pages_to_crawl: Minimum number of pages to crawl.
+    :param main_domain: The domain to stick with while crawling.
+    :return report: Lists of [document number, url] of the added, changed, removed and unreachable documents, and the unchanged count.
+    """
+
+    registry = load_registry()
+    pages = registry["PAGES"]
+
+    report = {"ADDED": list(), "CHANGED": list(), "REMOVED": list(), "UNREACHABLE": list(), "UNCHANGED": 0}
+
+    # Urls crawled in this crawl or kept after a temporary failure, all the others are removed at the end.
+    crawled_urls = set()
+
+    session = requests.Session()
+
+    # Queue for BFS.
+    helper_queue = CrawlFrontier()
+    main_url = helper_queue.add(main_url)
+
+    # Index of number of crawled websites, the main url is not counted.
+    crawled_sites_number = 0
+
+    while helper_queue:
+
+        url = helper_queue.pop()
+        page_entry = pages.get(url)
+
+        url_response = request_page_if_modified(session, url, page_entry)
+        fetched = url_response is not None and url_response.status_code in (200, 304)
+
+        if not fetched:
+
+            # If the main url can not be crawled, raise exception.
+            if url == main_url:
+
+                raise Exception('\nThe main URL ({url}) provided is broken.\n'.format(url=main_url))
+
+            # Pages which are gone are removed at the end, and new pages are only added once they answer.
+            if page_entry is None or (url_response is not None and url_response.status_code in GONE_STATUS_CODES):
+
+                continue
+
+        crawled_urls.add(url)
+
+        if not fetched:
+
+            # After a timeout or a server error, the page keeps its document and validators, and its outgoing links are still followed.
+            local_urls = load_document(page_entry["INDEX"])["OUTGOING_LINKS"]
+            report["UNREACHABLE"].append([page_entry["INDEX"], url])
+
+        elif url_response.status_code == 304:
+
+            # Unchanged since the last crawl, so its document already has its outgoing links.
+            local_urls = load_document(page_entry["INDEX"])["OUTGOING_LINKS"]
+            report["UNCHANGED"] += 1
+
+        else:
+
+            local_urls, unknown_anchors = get_outgoing_links(url, url_response.text, main_domain)
+            local_urls = local_urls or []
+
+            # New urls get the next document number, the others keep theirs.
+            document_name_index = page_entry["INDEX"] if page_entry is not None else registry["NEXT_INDEX"]
+            document_contents_map = create_document_contents(
+                document_name_index,
+                url,
+                extract_text_from_html(url_response.text),
+                local_urls
+            )
+            content_hash = get_document_hash(document_contents_map)
+
+            if page_entry is None:
+
+                registry["NEXT_INDEX"] += 1
+                page_entry = pages[url] = {"INDEX": document_name_index}
+                report["ADDED"].append([document_name_index, url])
+                save_document(document_contents_map)
+
+            elif page_entry["CONTENT_HASH"] != content_hash:
+
+                report["CHANGED"].append([document_name_index, url])
+                save_document(document_contents_map)
+
+            else:
+
+                report["UNCHANGED"] += 1
+
+            page_entry["ETAG"] = url_response.headers.get("ETag")
+            page_entry["LAST_MODIFIED"] = url_response.headers.get("Last-Modified")
+            page_entry["CONTENT_HASH"] = content_hash
+
+        for l in local_urls:
+
+            # Check if the URL follows the "GOODNESS" rules mentioned above.
+            if check_goodness(l) is False:
+
+                continue
+
+            # Add the new outgoing urls to the back of the queue. Duplicates are not added again.
+            if crawled_sites_number < number_of_pages_to_crawl and helper_queue.add(l) is not None:
+
+                crawled_sites_number += 1
+
+    # Pages which were not crawled again are gone, or not linked anymore.
+    for url in list(pages.keys()):
+
+        if url not in crawled_urls:
+
+            document_name_index = pages.pop(url)["INDEX"]
+            report["REMOVED"].append([document_name_index, url])
+
+            document_path = os.path.join(DATA_DIRECTORY, str(document_name_index) + ".json")
+            if os.path.isfile(document_path):
+
+                os.remove(document_path)
+
+    save_registry(registry)
+
+    with open(REPORT_FILE, "w") as rf:
+
+        json.dump(report, rf)
+
+    return report
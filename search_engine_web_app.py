@@ -4,10 +4,19 @@
 @date: 05/06/2019
 """
 
-from flask import Flask, render_template, request
+import time
+import atexit
+from flask import Flask, render_template, request, jsonify
 import search
+from searcher import Searcher
 app = Flask(__name__)
 
+# Most results a client can page through for one query (offset + k).
+MAX_RESULTS = 100
+
+# Load the inverted index and the page ranks once, at startup.
+searcher = Searcher()
+
 @app.route('/')
 def query():
    	return render_template('query_page.html')
@@ -15,9 +24,49 @@ def query():
 @app.route('/searchengine',methods=['POST', 'GET'])
 def result():
 	if request.method == 'POST':
-		result = search.main_search(request.form['Name'])
+		result = search.main_search(request.form['Name'], searcher)
 		return render_template("result.html",result=result)
 
+@app.route('/api/search')
+def api_search():
+	# Ranked results as JSON, for /api/search?q=<query>&k=<number of results>&offset=<results to skip>.
+	query_text = request.args.get('q', '').strip()
+
+	if query_text == '':
+		return jsonify({"ERROR": "Please enter a query to get the relevant links."}), 400
+
+	try:
+		k = int(request.args.get('k', search.TOP_SITES))
+		offset = int(request.args.get('offset', 0))
+	except ValueError:
+		k, offset = 0, 0
+
+	if k < 1 or offset < 0 or offset + k > MAX_RESULTS:
+		return jsonify({"ERROR": "k must be at least 1, offset at least 0 and offset + k at most {}.".format(MAX_RESULTS)}), 400
+
+	# The top offset + k results are scored, and the first offset are skipped.
+	search_start_time = time.perf_counter()
+	top_results = searcher.search_with_scores(query_text, offset + k)[offset:]
+	search_time = time.perf_counter() - search_start_time
+
+	return jsonify({
+		"QUERY": query_text,
+		"K": k,
+		"OFFSET": offset,
+		"RESULTS": [
+			{"RANK": offset + rank, "URL": url, "SCORE": score} for rank, (url, score) in enumerate(top_results, 1)
+		],
+		"TIME_MS": search_time * 1000
+	})
+
+@app.route('/metrics')
+def metrics():
+	# Hit rates of the result cache and of the stem cache.
+	return jsonify(searcher.statistics())
+
 if __name__ == '__main__':
-	app.run(host='127.0.0.1', port=8000, debug=True)
+	# Development server only. In production, run it with gunicorn: gunicorn -c gunicorn.conf.py search_engine_web_app:app
+	# Save the cached stems on shutdown, so the next start is warm. Under gunicorn, the workers save them on exit.
+	atexit.register(searcher.save_stem_cache)
+	app.run(host='127.0.0.1', port=8000, threaded=True)
 	
\ No newline at end of file
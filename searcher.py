@@ -0,0 +1,269 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import os
+import time
+import threading
+import numpy as np
+
+from caches import STEM_CACHE
+from caches import STEM_CACHE_FILE
+from caches import PostingsCache
+from caches import QueryResultCache
+from cosine_similarity import load_inverted_index
+from cosine_similarity import get_top_k_similar_documents
+from index_segments import MANIFEST_FILE
+from index_segments import CURRENT_INDEX_FILE
+from page_rank_prior import PRIOR_INFORMATION_FILE
+from page_rank_prior import get_index_information
+from page_rank_prior import load_page_rank_prior
+from queries_cleaning_processing import preprocess_query_text
+from queries_cleaning_processing import generate_query_TFIDF
+
+TF_IDF_FILES_DIR = "./tf_idf_files"
+RANKS_DIR = "./web_page_ranks"
+
+# Weights of the cosine similarity and of the page rank in the score of a document.
+RELEVANCE_WEIGHT = 0.7
+PAGE_RANK_WEIGHT = 0.3
+
+# Seconds between two checks for a new index or new page ranks on disk.
+INDEX_CHECK_INTERVAL = 5
+
+
+def get_index_version(tf_idf_files_dir, ranks_dir):
+    """
+    Function to identify the index and page ranks on disk, without reading them.
+    Every full build, update of the index or update of the page ranks replaces one of these files.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param ranks_dir: Directory of the page ranks.
+    :return index_version: Modification times of the manifest, the current index file, the page rank prior and the page ranks.
+    """
+
+    index_version = list()
+    for path in [
+        os.path.join(tf_idf_files_dir, MANIFEST_FILE),
+        os.path.join(tf_idf_files_dir, CURRENT_INDEX_FILE),
+        os.path.join(tf_idf_files_dir, PRIOR_INFORMATION_FILE),
+        os.path.join(ranks_dir, "web_ranks.json")
+    ]:
+
+        try:
+
+            index_version.append(os.stat(path).st_mtime_ns)
+
+        except OSError:
+
+            index_version.append(None)
+
+    return tuple(index_version)
+
+
+class Searcher(object):
+    """
+    Long-lived search state.
+    The inverted index and the page ranks are loaded once, so a search only pays for scoring.
+    Results are cached by the preprocessed words of the query, until a new index or new page ranks are loaded.
+    """
+
+    def __init__(self, tf_idf_files_dir=TF_IDF_FILES_DIR, ranks_dir=RANKS_DIR, stem_cache_file=STEM_CACHE_FILE,
+                 relevance_weight=RELEVANCE_WEIGHT, page_rank_weight=PAGE_RANK_WEIGHT):
+        """
+        Function to load the inverted index, the page ranks and the saved stems into memory.
+        :param tf_idf_files_dir: Directory of the TF-IDF files.
+        :param ranks_dir: Directory of the page ranks.
+        :param stem_cache_file: File of the stems saved by the last query server.
+        :param relevance_weight: Positive weight of the cosine similarity in the score of a document.
+        :param page_rank_weight: Weight of the page rank in the score of a document.
+        """
+
+        self.tf_idf_files_dir = tf_idf_files_dir
+        self.ranks_dir = ranks_dir
+        self.relevance_weight = relevance_weight
+        self.page_rank_weight = page_rank_weight
+
+        # Results of the queries searched before.
+        self.result_cache = QueryResultCache()
+
+        # Only one thread loads a new index.
+        self.reload_lock = threading.Lock()
+        self.index_state = None
+        self.load_index()
+
+        # Stems of the query words seen before, so the first searches do not stem them again.
+        self.stem_cache_file = stem_cache_file
+        STEM_CACHE.load(stem_cache_file)
+
+        print("Searcher loaded {} documents, {} page ranks and {} stems.".format(
+            self.inverted_index.number_of_documents,
+            int(np.count_nonzero(self.page_rank_prior)),
+            STEM_CACHE.statistics()["SIZE"])
+        )
+
+    def load_index(self):
+        """
+        Function to load the index and the page rank prior.
+        """
+
+        index_version = get_index_version(self.tf_idf_files_dir, self.ranks_dir)
+
+        # Memory mapped binary index with document urls, norms, postings and max scores of every word,
+        # behind a cache of the decoded postings of the words searched often.
+        inverted_index = PostingsCache(load_inverted_index(self.tf_idf_files_dir))
+
+        # Memory mapped page rank of every document id, so the search never looks a page rank up by url.
+        page_rank_prior = load_page_rank_prior(inverted_index, self.tf_idf_files_dir)
+        if page_rank_prior is None:
+
+            page_rank_prior = self.get_missing_page_rank_prior(inverted_index)
+
+        # Searches running meanwhile keep the index, prior and version they started with.
+        self.index_state = (inverted_index, page_rank_prior, index_version)
+        self.last_index_check = time.monotonic()
+
+    def get_missing_page_rank_prior(self, inverted_index):
+        """
+        Function to get a prior when the saved one is not aligned with the index, without reading the page ranks.
+        Every index gets its prior before it is committed, so this only happens while a new prior or a new index
+        is being committed, or when there are no page ranks yet.
+        :param inverted_index: The index loaded.
+        :return page_rank_prior: The previous prior if it belongs to the same index, else zeros.
+        """
+
+        if self.index_state is not None:
+
+            previous_index, previous_prior, previous_version = self.index_state
+            if get_index_information(previous_index) == get_index_information(inverted_index):
+
+                return previous_prior
+
+        print("Warning: no page rank prior is aligned with the index, so the page ranks are left out of the scores.")
+
+        return np.zeros(inverted_index.number_of_documents, dtype=np.float64)
+
+    @property
+    def inverted_index(self):
+        """
+        Function to get the index searched now.
+        :return inverted_index: Postings cache in front of the binary index, or of the segments of an index updated incrementally.
+        """
+
+        return self.index_state[0]
+
+    @property
+    def page_rank_prior(self):
+        """
+        Function to get the page rank prior of the index searched now.
+        :return page_rank_prior: Array of the page rank prior of every document id.
+        """
+
+        return self.index_state[1]
+
+    def refresh_index(self):
+        """
+        Function to load the index again once a new generation or new page ranks are written,
+        checking the files on disk at most once every INDEX_CHECK_INTERVAL seconds.
+        """
+
+        if time.monotonic() - self.last_index_check < INDEX_CHECK_INTERVAL:
+
+            return
+
+        # Another thread is checking already.
+        if self.reload_lock.acquire(blocking=False) is False:
+
+            return
+
+        try:
+
+            self.last_index_check = time.monotonic()
+            if get_index_version(self.tf_idf_files_dir, self.ranks_dir) != self.index_state[2]:
+
+                print("New index or page ranks found. Loading them.")
+                self.load_index()
+
+                # Results of the index loaded before are dropped.
+                self.result_cache.clear()
+
+        finally:
+
+            self.reload_lock.release()
+
+    def statistics(self):
+        """
+        Function to get the counters of the caches of the searcher.
+        :return statistics: Statistics of the result cache, of the postings cache and of the stem cache.
+        """
+
+        return {
+            "RESULT_CACHE": self.result_cache.statistics(),
+            "POSTINGS_CACHE": self.inverted_index.statistics(),
+            "STEM_CACHE": STEM_CACHE.statistics()
+        }
+
+    def save_stem_cache(self):
+        """
+        Function to save the cached stems, for the next query server to start with them.
+        """
+
+        STEM_CACHE.save(self.stem_cache_file)
+
+    def search_with_scores(self, query_text, k=10):
+        """
+        Function to get the top sites for a query with their scores, entirely in memory.
+        Nothing is written or read on disk, so concurrent searches do not interfere. Repeated queries come from the result cache.
+        :param query_text: User's query.
+        :param k: Number of urls to return.
+        :return top_results: Top k (url, score) based on user's query, in descending order of the score.
+        """
+
+        self.refresh_index()
+        inverted_index, page_rank_prior, index_version = self.index_state
+
+        # Preprocess the query. Queries with the same words share their results, whatever their order.
+        query_words = preprocess_query_text(query_text)
+        cache_key = (index_version, tuple(sorted(query_words)), k)
+
+        top_results = self.result_cache.get(cache_key)
+        if top_results is not None:
+
+            return list(top_results)
+
+        # Inverse Document Frequency of the query words found in the index.
+        idf_dict = dict()
+        for word in set(query_words):
+
+            idf = inverted_index.idf(word)
+            if idf is not None:
+
+                idf_dict[word] = idf
+
+        query_tf_idf = generate_query_TFIDF(query_words, idf_dict)
+
+        # Get the top k documents, scored by their cosine similarity and their page rank together.
+        similar_documents = get_top_k_similar_documents(
+            inverted_index,
+            query_tf_idf,
+            k,
+            page_rank_prior,
+            self.relevance_weight,
+            self.page_rank_weight
+        )
+
+        top_results = [(inverted_index.url(doc_id), score) for score, doc_id in similar_documents]
+        self.result_cache.put(cache_key, tuple(top_results))
+
+        return top_results
+
+    def search(self, query_text, k=10):
+        """
+        Function to get the top sites for a query.
+        :param query_text: User's query.
+        :param k: Number of urls to return.
+        :return top_urls: Top k links based on user's query.
+        """
+
+        return [url for url, score in self.search_with_scores(query_text, k)]
@@ -0,0 +1,143 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import numpy as np
+from scipy import sparse
+
+from cosine_similarity import get_query_norm
+from cosine_similarity import load_inverted_index
+from queries_cleaning_processing import queries_cleaning
+
+
+class SparseSimilarityEngine(object):
+    """
+    Cosine similarity engine for batches of queries.
+    Documents are the L2 normalized rows of a sparse matrix, so a batch of queries is scored with one matrix product.
+    """
+
+    def __init__(self, inverted_index):
+        """
+        Function to build the document matrix from the inverted index.
+        :param inverted_index: Binary index with document urls, norms and postings of every word.
+        """
+
+        self.inverted_index = inverted_index
+
+        # Every word of the term dictionary is a column of the matrix.
+        self.word_columns = dict()
+        for term_number in range(inverted_index.number_of_words):
+
+            self.word_columns[inverted_index.word_at(term_number)] = term_number
+
+        # All the postings are decoded at once.
+        columns, doc_ids, weights = inverted_index.all_postings()
+
+        # Dividing every weight by the norm of its document makes every row a unit vector.
+        norms = np.asarray(inverted_index.norms, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+
+            weights = np.where(weights != 0, weights / norms[doc_ids], 0)
+
+        # Transposed (words x documents), so the product with the queries is (queries x documents).
+        self.document_matrix_t = sparse.csr_matrix(
+            (weights, (columns, doc_ids)),
+            shape=(inverted_index.number_of_words, inverted_index.number_of_documents)
+        )
+        self.document_matrix_t.eliminate_zeros()
+
+    def build_query_matrix(self, queries):
+        """
+        Function to build the L2 normalized sparse matrix of a batch of queries.
+        :param queries: List of TF-IDF Maps of the queries.
+        :return query_matrix: Sparse matrix (queries x words).
+        """
+
+        rows, columns, weights = list(), list(), list()
+        for row, query_words_and_weight_dict in enumerate(queries):
+
+            # Words which are not in the index still count in the query norm, as in cosine_similarity.
+            query_term = get_query_norm(query_words_and_weight_dict)
+            if query_term == 0:
+
+                continue
+
+            for word, word_weights in query_words_and_weight_dict.items():
+
+                if word in self.word_columns:
+
+                    rows.append(row)
+                    columns.append(self.word_columns[word])
+                    weights.append(word_weights / query_term)
+
+        query_matrix = sparse.csr_matrix(
+            (weights, (rows, columns)),
+            shape=(len(queries), len(self.word_columns))
+        )
+
+        return query_matrix
+
+    def get_top_k_similar_documents(self, queries, k):
+        """
+        Function to get the k documents most similar to every query of a batch.
+        :param queries: List of TF-IDF Maps of the queries.
+        :param k: Number of documents to get for each query.
+        :return top_documents: List, for every query, of at most k (CS score, document id) in descending order of the score.
+        """
+
+        # Cosine similarity of every query and document in a single sparse product.
+        similarity = (self.build_query_matrix(queries) @ self.document_matrix_t).tocsr()
+        similarity.eliminate_zeros()
+
+        top_documents = list()
+        for row in range(similarity.shape[0]):
+
+            start, end = similarity.indptr[row], similarity.indptr[row + 1]
+            scores = similarity.data[start:end]
+            doc_ids = similarity.indices[start:end]
+
+            # Select the k best without sorting the whole row, then sort only those.
+            if len(scores) > k:
+
+                selected = np.argpartition(-scores, k - 1)[:k]
+                scores, doc_ids = scores[selected], doc_ids[selected]
+
+            order = np.argsort(-scores, kind="stable")
+            top_documents.append(list(zip(scores[order].tolist(), doc_ids[order].tolist())))
+
+        return top_documents
+
+
+def get_sparse_cosine_similarity(inverted_index=None, k=200):
+    """
+    Driver function to get the cosine similarity between documents and the queries in the sample queries file.
+    :param inverted_index: Inverted index already in memory. If None, it is read from disk.
+    :param k: Number of most similar urls to keep for each query.
+    :return queries_documents_similarity: Mapping of query and its list of (url, CS score) in descending order of the score.
+    """
+
+    # Get the TF-IDF of the queries.
+    queries_tf_idf = queries_cleaning()
+
+    if inverted_index is None:
+
+        inverted_index = load_inverted_index()
+
+    engine = SparseSimilarityEngine(inverted_index)
+
+    query_numbers = list(queries_tf_idf.keys())
+    top_documents = engine.get_top_k_similar_documents([queries_tf_idf[query] for query in query_numbers], k)
+
+    # To store the CS score.
+    queries_documents_similarity = dict()
+    for query, query_documents_similarity in zip(query_numbers, top_documents):
+
+        if len(query_documents_similarity) != 0:
+
+            queries_documents_similarity[query] = [
+                (inverted_index.url(doc_id), cosine_similarity) for cosine_similarity, doc_id in query_documents_similarity
+            ]
+
+    return queries_documents_similarity
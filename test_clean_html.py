@@ -0,0 +1,82 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import re
+from nltk.stem import PorterStemmer
+
+from caches import StemCache
+from clean_html import generate_terms
+from clean_html import get_stop_words
+from generate_data import create_document_contents
+
+# Tokens going through every step of the preprocessing: empty tokens, stopwords before and after stemming,
+# punctuation, words of 2 letters or less, numbers, Unicode letters and repeated tokens.
+TOKENS = [
+    "", "the", "The", "THE", "is", "was", "being", "running", "Runs", "runner's", "Searching", "searched",
+    "engines", "engine", "SEARCH", ",", ".", "...", "--", "'s", "n't", "I'm", "don't", "U.S.A.", "e-mail",
+    "x", "ab", "abc", "123", "42nd", "naïve", "café", "résumé", "Straße", "über-cool", "İstanbul", "中文",
+    "ﬁle", " ", "ÀÉÎ", "running", "the", "", "naïve", "abilities", "ours", "yourselves", "doing"
+]
+
+
+def preprocess_tokens_with_lists(tokens, stopWords, ps):
+    """
+    Function to preprocess tokens the way clean_html did before the terms were generated one token at a time.
+    :param tokens: Tokens of the text.
+    :param stopWords: Set of stopwords.
+    :param ps: Porter Stemmer, or a stem cache in front of it.
+    :return corpus: Preprocessed words.
+    """
+
+    # Create corpus, remove special chars and lowercase operation.
+    corpus = [re.sub('[^A-Za-z]+', '', token).lower() for token in tokens]
+
+    # Remove Stopwords before stemming
+    corpus = [word for word in corpus if word not in stopWords]
+
+    # Integrate Porter Stemmer
+    corpus = [ps.stem(word) for word in corpus]
+
+    # Remove Stopwords after stemming
+    corpus = [word for word in corpus if word not in stopWords]
+
+    # Remove unnecessary empty strings from corpus
+    corpus = [word for word in corpus if word != '' and len(word) > 2]
+
+    return corpus
+
+
+def test_generate_terms_matches_list_pipeline():
+    """
+    Function to check the generated terms against the list based preprocessing, with and without the stem cache.
+    """
+
+    stopWords = get_stop_words()
+
+    for ps in [PorterStemmer(), StemCache()]:
+
+        assert list(generate_terms(TOKENS, stopWords, ps)) == preprocess_tokens_with_lists(TOKENS, stopWords, PorterStemmer())
+
+
+def test_generate_terms_of_tokens_without_terms():
+    """
+    Function to check that no token and tokens without any term generate no term.
+    """
+
+    stopWords = get_stop_words()
+
+    assert list(generate_terms([], stopWords, PorterStemmer())) == []
+    assert list(generate_terms(["", "the", ",", "ab", "中文", "123"], stopWords, PorterStemmer())) == []
+
+
+def test_empty_document_has_no_words():
+    """
+    Function to check that a page without text gets an empty word count map, not a count of the empty word.
+    """
+
+    document_contents_map = create_document_contents(1, "https://www.uic.edu/", "", [])
+
+    assert document_contents_map["WORD_COUNT_MAP"] == {}
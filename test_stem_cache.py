@@ -0,0 +1,107 @@
+"""
+@author: Sriram Veturi
+@title: SmartSearch - An Intelligent Search Engine.
+@date: 05/06/2019
+"""
+
+import os
+import sys
+import json
+import atexit
+import importlib
+import importlib.util
+
+from caches import StemCache
+from binary_index import BinaryIndexWriter
+from index_segments import write_current_index
+
+GUNICORN_CONF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+
+
+def write_small_index(tf_idf_files_dir, ranks_dir):
+    """
+    Function to write a binary index of two documents, as the last full build, and their page ranks.
+    :param tf_idf_files_dir: Directory of the TF-IDF files.
+    :param ranks_dir: Directory of the page ranks.
+    """
+
+    norms = [1.0, 1.0]
+    index_writer = BinaryIndexWriter(os.path.join(tf_idf_files_dir, "index_1"))
+    index_writer.add_word("graduat", [0, 1], [0.5, 0.25], norms)
+    index_writer.add_word("school", [1], [0.25], norms)
+    index_writer.close(["https://www.uic.edu/", "https://grad.uic.edu/"], norms)
+
+    write_current_index(tf_idf_files_dir, {"BUILD": 1, "PATH": "index_1"})
+
+    os.makedirs(ranks_dir)
+    with open(os.path.join(ranks_dir, "web_ranks.json"), "w") as rf:
+
+        json.dump([["https://www.uic.edu/", 0.6], ["https://grad.uic.edu/", 0.4]], rf)
+
+
+def test_save_keeps_the_stems_saved_by_other_workers(tmp_path):
+    """
+    Function to check that a stem cache adds its stems to the saved ones, as the most recently used.
+    """
+
+    cache_file = str(tmp_path / "stem_cache.json")
+
+    first_worker, second_worker = StemCache(), StemCache()
+    first_worker.stem("running")
+    first_worker.stem("searches")
+    second_worker.stem("engines")
+    second_worker.stem("running")
+
+    first_worker.save(cache_file)
+    second_worker.save(cache_file)
+
+    with open(cache_file, "r") as cf:
+
+        assert json.load(cf) == [["searches", "search"], ["engines", "engin"], ["running", "run"]]
+
+    # The saved stems are bounded like the cache.
+    small_worker = StemCache(max_size=2)
+    small_worker.stem("schools")
+    small_worker.save(cache_file)
+
+    with open(cache_file, "r") as cf:
+
+        assert json.load(cf) == [["running", "run"], ["schools", "school"]]
+
+
+def test_only_the_gunicorn_workers_save_the_stems(tmp_path, monkeypatch):
+    """
+    Function to check that loading the app, like the gunicorn master does before forking, never saves the stems,
+    and that the worker_exit hook saves the stems of the searches.
+    """
+
+    write_small_index(str(tmp_path / "tf_idf_files"), str(tmp_path / "web_page_ranks"))
+    monkeypatch.chdir(tmp_path)
+
+    # Everything the app registers to run at exit, which the master would run when it stops.
+    exit_functions = list()
+    monkeypatch.setattr(atexit, "register", lambda function, *args, **kwargs: exit_functions.append(function))
+    monkeypatch.delitem(sys.modules, "search_engine_web_app", raising=False)
+
+    web_app = importlib.import_module("search_engine_web_app")
+
+    for function in exit_functions:
+
+        function()
+
+    assert os.path.isfile("stem_cache.json") is False
+
+    # A worker searches, then exits.
+    response = web_app.app.test_client().get("/api/search?q=graduate+schools")
+    assert response.status_code == 200
+
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", GUNICORN_CONF_FILE)
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    gunicorn_conf.worker_exit(None, None)
+
+    with open("stem_cache.json", "r") as cf:
+
+        saved_words = [word for word, stem in json.load(cf)]
+
+    assert "graduate" in saved_words and "schools" in saved_words
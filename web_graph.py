@@ -6,8 +6,15 @@
 
 import os
 import json
+import argparse
+import numpy as np
+from scipy import sparse
 
-from page_rank import get_page_ranks
+from page_rank import build_link_matrix
+from page_rank import update_link_matrix
+from page_rank import get_page_ranks_from_links
+from recrawl import REPORT_FILE
+from page_rank_prior import write_page_rank_prior
 
 GRAPH_DIR = "./web_graph"
 DATA_DIR = "./documents"
@@ -40,43 +47,160 @@ def build_web_graph():
 	return web_graph
 
 
-def get_web_page_ranks():
+def create_directory(directory, description):
 	"""
-	Function to get the page ranks in the entire crawled web.
-	:return web_page_rank: Mapping of pages with their page rank scores.
+	Function to create a directory, if it does not exist.
+	:param directory: Directory to create.
+	:param description: What the directory stores, for the messages.
 	"""
 
-	# Create directory to store the ranks.
 	# If it already exists, return True.
-	if os.path.isdir(PAGE_RANKS_DIR) is True:
+	if os.path.isdir(directory) is True:
 
-		print("Directory to store the ranks already exists. Moving on.")
+		print("Directory to store the {} already exists. Moving on.".format(description))
 
 	else:
 
 		try:
 			
-			os.mkdir(PAGE_RANKS_DIR)
-			print("Directory created to store the ranks.")
+			os.mkdir(directory)
+			print("Directory created to store the {}.".format(description))
 
 		except Exception as e:
 
 			print(e)
 
+
+def save_link_matrix(urls, in_web_graph, link_matrix):
+	"""
+	Function to save the link matrix of the web graph, so the next update of the page ranks only rebuilds the changed rows.
+	:param urls: Every known url, in the order of the matrix rows and columns.
+	:param in_web_graph: Boolean array of the urls which are nodes of the web graph.
+	:param link_matrix: CSR matrix where row B, column A is the number of links B -> A.
+	"""
+
+	create_directory(GRAPH_DIR, "web graph")
+	with open(os.path.join(GRAPH_DIR, "urls.json"), 'w') as urls_file:
+
+		json.dump(urls, urls_file)
+
+	np.save(os.path.join(GRAPH_DIR, "in_web_graph.npy"), in_web_graph)
+	sparse.save_npz(os.path.join(GRAPH_DIR, "link_matrix.npz"), link_matrix)
+
+
+def load_link_matrix():
+	"""
+	Function to load the saved link matrix of the web graph.
+	:return urls: Every known url, in the order of the matrix rows and columns.
+	:return in_web_graph: Boolean array of the urls which are nodes of the web graph.
+	:return link_matrix: CSR matrix where row B, column A is the number of links B -> A.
+	"""
+
+	with open(os.path.join(GRAPH_DIR, "urls.json"), "r") as urls_file:
+
+		urls = json.load(urls_file)
+
+	in_web_graph = np.load(os.path.join(GRAPH_DIR, "in_web_graph.npy"))
+	link_matrix = sparse.load_npz(os.path.join(GRAPH_DIR, "link_matrix.npz")).tocsr()
+
+	return urls, in_web_graph, link_matrix
+
+
+def save_web_page_ranks(web_page_ranks):
+	"""
+	Function to save the page ranks.
+	:param web_page_ranks: Sorted list of pages with their page rank scores.
+	"""
+
+	# Create a json file which would store the web graph information of the url.
+	document_name = "web_ranks.json"
+	with open(os.path.join(PAGE_RANKS_DIR, document_name), 'w') as ranks_file:
+
+		json.dump(web_page_ranks, ranks_file)
+
+	# Page ranks of the document ids of the index, if it is built already.
+	write_page_rank_prior(page_ranks_file=os.path.join(PAGE_RANKS_DIR, document_name))
+
+
+def update_web_page_ranks():
+	"""
+	Function to update the page ranks after an incremental crawl.
+	The saved link matrix gets the added, changed and removed pages of the crawl report,
+	and the page ranks start from the saved ones instead of 1 / N.
+	:return web_page_rank: Mapping of pages with their page rank scores.
+	"""
+
+	with open(REPORT_FILE, "r") as rf:
+
+		report = json.load(rf)
+
+	# Link matrix and page ranks before the crawl.
+	urls, in_web_graph, link_matrix = load_link_matrix()
+
+	with open(os.path.join(PAGE_RANKS_DIR, "web_ranks.json"), "r") as ranks_file:
+
+		previous_page_ranks = dict(json.load(ranks_file))
+
+	# Outgoing links of the added and changed pages, from their documents.
+	changed_nodes = dict()
+	for document_number, url in report["ADDED"] + report["CHANGED"]:
+
+		with open(os.path.join(DATA_DIR, "{}.json".format(document_number)), "r") as jf:
+
+			changed_nodes[url] = dict(json.load(jf))["OUTGOING_LINKS"]
+
+	removed_nodes = [url for document_number, url in report["REMOVED"]]
+
+	urls, in_web_graph, link_matrix = update_link_matrix(urls, in_web_graph, link_matrix, changed_nodes, removed_nodes)
+	save_link_matrix(urls, in_web_graph, link_matrix)
+	print("Web Graph Updated with {} added or changed and {} removed pages.".format(len(changed_nodes), len(removed_nodes)))
+
+	web_page_ranks = get_page_ranks_from_links(urls, in_web_graph, link_matrix, previous_page_ranks)
+	print("Ranks updated.")
+
+	save_web_page_ranks(web_page_ranks)
+
+	return None
+
+
+def get_web_page_ranks():
+	"""
+	Function to get the page ranks in the entire crawled web.
+	:return web_page_rank: Mapping of pages with their page rank scores.
+	"""
+
+	# Create directory to store the ranks.
+	create_directory(PAGE_RANKS_DIR, "ranks")
+
 	# First, build the web graph.
 	web_graph = build_web_graph()
+	urls, in_web_graph, link_matrix = build_link_matrix(web_graph)
+	save_link_matrix(urls, in_web_graph, link_matrix)
 	print("Web Graph Built.")
 	
 	# Now that we have the web graph, get page ranks of all the nodes in the web graph.
-	web_page_ranks = get_page_ranks(web_graph)
+	web_page_ranks = get_page_ranks_from_links(urls, in_web_graph, link_matrix)
 	print("Ranks calculated.")
 
-	# Create a json file which would store the web graph information of the url.
-	document_name = "web_ranks.json"
-	with open(os.path.join(PAGE_RANKS_DIR, document_name), 'w') as ranks_file:
-
-		json.dump(web_page_ranks, ranks_file)
+	save_web_page_ranks(web_page_ranks)
 
 	return None
 
-get_web_page_ranks()
+# Main funciton starts here..
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Page Ranks for Search Engine")
+	parser.add_argument(
+		"--incremental",
+		action="store_true",
+		help="Update the page ranks with the pages of the last incremental crawl, starting from the saved ones."
+	)
+	args = parser.parse_args()
+
+	if args.incremental:
+
+		update_web_page_ranks()
+
+	else:
+
+		get_web_page_ranks()